@@ -0,0 +1,122 @@
+# 基于 NumPy 的批量随机模拟：N 局棋同时推进，棋盘为 uint64 位棋盘数组
+# 未安装 NumPy 时 np 为 None，调用方应退回逐局模拟
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    _ZERO = np.uint64(0)
+    _ONE = np.uint64(1)
+    _INNER_COLS = np.uint64(0x7E7E7E7E7E7E7E7E)
+    _FULL_MASK = np.uint64(0xFFFFFFFFFFFFFFFF)
+    # 与 Bitboard._SHIFTS 相同的方向
+    _SHIFTS = (
+        (np.uint64(1), _INNER_COLS),
+        (np.uint64(8), _FULL_MASK),
+        (np.uint64(7), _INNER_COLS),
+        (np.uint64(9), _INNER_COLS),
+    )
+
+
+def available():
+    return np is not None
+
+
+# 每一局 own 一方的合法落子掩码
+def batch_moves(own, opp):
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for s, m in _SHIFTS:
+        mm = opp & m
+        x = (own << s) & mm
+        for _ in range(5):
+            x |= (x << s) & mm
+        moves |= (x << s) & empty
+
+        x = (own >> s) & mm
+        for _ in range(5):
+            x |= (x >> s) & mm
+        moves |= (x >> s) & empty
+    return moves
+
+
+# 每一局在 bits（单个置位，0 表示不落子）落子时需要翻转的棋子
+def batch_flips(own, opp, bits):
+    flips = np.zeros_like(own)
+    for s, m in _SHIFTS:
+        mm = opp & m
+
+        f = np.zeros_like(own)
+        x = (bits << s) & mm
+        for _ in range(6):
+            f |= x
+            x = x << s
+            flips |= np.where((x & own) != _ZERO, f, _ZERO)
+            x &= mm
+
+        f = np.zeros_like(own)
+        x = (bits >> s) & mm
+        for _ in range(6):
+            f |= x
+            x = x >> s
+            flips |= np.where((x & own) != _ZERO, f, _ZERO)
+            x &= mm
+    return flips
+
+
+# (N, 64) 的 0/1 数组，第 k 列对应第 k 位
+def _unpack(x):
+    return np.unpackbits(x.astype("<u8").view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+
+
+def batch_popcount(x):
+    return _unpack(x).sum(axis=1, dtype=np.int16)
+
+
+# 每一局从 moves 中等概率随机选出一个位置，返回只有该位置置位的数组
+def pick_random_bits(moves, rng):
+    bits = _unpack(moves)
+    # 置位的格子权重落在 [1, 2)，取最大值即在合法位置中均匀随机
+    idx = np.argmax(bits + rng.random(bits.shape), axis=1).astype(np.uint64)
+    return np.where(moves != _ZERO, _ONE << idx, _ZERO)
+
+
+# 从同一局面 (own 为轮到下棋的一方) 同时进行 n 局随机模拟，最多 max_depth + 1 步
+# 返回长度为 n 的数组，为开始时轮到下棋的一方领先的棋子数
+def batch_playout(own, opp, n, rng, max_depth=32):
+    own = np.full(n, own, dtype=np.uint64)
+    opp = np.full(n, opp, dtype=np.uint64)
+    # swapped 为 True 表示 own 当前是开始时的对手
+    swapped = np.zeros(n, dtype=bool)
+    done = np.zeros(n, dtype=bool)
+
+    for _ in range(max_depth + 1):
+        moves = batch_moves(own, opp)
+        no_move = (moves == _ZERO) & ~done
+        if no_move.any():
+            # 无子可下时由对方继续下，双方都无子可下则结束
+            opp_moves = batch_moves(opp, own)
+            passed = no_move & (opp_moves != _ZERO)
+            done |= no_move & ~passed
+            own, opp = np.where(passed, opp, own), np.where(passed, own, opp)
+            moves = np.where(passed, opp_moves, moves)
+            swapped ^= passed
+        if done.all():
+            break
+        moves = np.where(done, _ZERO, moves)
+
+        bits = pick_random_bits(moves, rng)
+        flips = batch_flips(own, opp, bits)
+        own = own | flips | bits
+        opp = opp ^ flips
+
+        # 转换轮次
+        active = ~done
+        own, opp = np.where(active, opp, own), np.where(active, own, opp)
+        swapped ^= active
+
+    mine = np.where(swapped, opp, own)
+    theirs = np.where(swapped, own, opp)
+    return batch_popcount(mine) - batch_popcount(theirs)
@@ -0,0 +1,201 @@
+# 引擎热点的基准测试：在固定随机种子生成的开局、中局、残局局面上计时
+# 结果以 JSON 输出，便于在不同提交之间比较
+# 用法: python Benchmark.py -o bench.json
+# 内存检查: python Benchmark.py --memory-check --max-tree-nodes 500
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import MCTS_Algorithm as rvs
+import Bitboard as bb
+import Playout_Policy
+
+# 局面名称 -> 从初始局面随机落子的步数
+POSITIONS = {"opening": 4, "midgame": 24, "endgame": 48}
+POSITION_SEED = 20240601
+
+
+# 用固定种子从初始局面随机下 plies 步，返回 (棋盘, 轮到下棋的一方)
+def make_position(plies, seed=POSITION_SEED):
+    rng = random.Random(seed * 100 + plies)
+    board = rvs.getInitialBoard()
+    tile = rvs.PLAYER_NUM
+    played = 0
+    while played < plies:
+        positions = rvs.possible_positions(board, tile)
+        if not positions:
+            tile = bb.opponent(tile)
+            positions = rvs.possible_positions(board, tile)
+            if not positions:
+                break
+        rvs.updateBoard(board, tile, *rng.choice(positions))
+        tile = bb.opponent(tile)
+        played += 1
+    # 保证轮到下棋的一方有子可下
+    if not rvs.possible_positions(board, tile):
+        tile = bb.opponent(tile)
+    return board, tile
+
+
+# 在 duration 秒内反复调用 func，返回每秒调用次数
+def rate(func, duration):
+    count = 0
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end:
+        func()
+        count += 1
+        now = time.perf_counter()
+    return count / (now - start)
+
+
+def bench_movegen(board, tile, duration):
+    positions = rvs.possible_positions(board, tile)
+    rows = [(i, j) for i in range(bb.BOARD_SIZE) for j in range(bb.BOARD_SIZE)]
+
+    def check_all():
+        for i, j in rows:
+            rvs.updateBoard(board, tile, i, j, checkonly=True)
+
+    return {
+        "possible_positions_per_sec": rate(lambda: rvs.possible_positions(board, tile), duration),
+        "update_board_checks_per_sec": rate(check_all, duration) * len(rows),
+        "legal_moves": len(positions),
+    }
+
+
+# 均匀随机模拟的吞吐量，以及各模拟策略的吞吐量
+def bench_playout(board, tile, duration):
+    random.seed(POSITION_SEED)
+    result = {"playouts_per_sec": rate(lambda: rvs.find_playout(board, tile, tile), duration), "policy_playouts_per_sec": {}}
+    for name, policy in Playout_Policy.POLICIES.items():
+        if policy.choose is None:
+            continue
+        random.seed(POSITION_SEED)
+        result["policy_playouts_per_sec"][name] = rate(lambda: rvs.find_playout(board, tile, tile, policy=policy), duration)
+    return result
+
+
+def bench_search(board, tile, difficulty, playouts, repeat):
+    latencies = []
+    for r in range(repeat):
+        random.seed(POSITION_SEED + r)
+        rvs.reset_tree()
+        start = time.perf_counter()
+        # 开局库和残局求解不计入，测量的是 MCTS 本身的搜索速度
+        rvs.mctsNextPosition(board, difficulty, max_playouts=playouts, tile=tile, reuse_tree=False, workers=1,
+                             endgame_empties=0, use_book=False)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    median = latencies[len(latencies) // 2]
+    return {
+        "playouts": playouts,
+        "iterations_per_sec": playouts / median,
+        "move_latency_median": median,
+        "move_latency_min": latencies[0],
+        "move_latency_max": latencies[-1],
+    }
+
+
+# 用 tracemalloc 记录一次搜索的内存峰值和结束时的搜索树结点数
+def _traced_search(board, tile, difficulty, playouts, max_tree_nodes):
+    rvs.reset_tree()
+    stats = rvs.SearchStats()
+    random.seed(POSITION_SEED)
+    tracemalloc.start()
+    try:
+        rvs.mctsNextPosition(board, difficulty, max_playouts=playouts, tile=tile, workers=1, use_book=False,
+                             endgame_empties=0, max_tree_nodes=max_tree_nodes, stats=stats)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        rvs.reset_tree()
+    return peak, stats.node_count
+
+
+# 以同样的模拟次数分别在结点数上限下和不限结点数搜索，检查上限确实生效：
+# 不限结点数时树要超过上限（否则检查没有意义），有上限时树不超过上限且内存峰值更低
+# limit_mb 不为 None 时内存峰值还不能超过该值
+def check_memory(max_tree_nodes, playouts, limit_mb=None, difficulty=2):
+    board, tile = make_position(POSITIONS["midgame"])
+    peak, node_count = _traced_search(board, tile, difficulty, playouts, max_tree_nodes)
+    unbounded_peak, unbounded_nodes = _traced_search(board, tile, difficulty, playouts, 0)
+    ok = 0 < node_count <= max_tree_nodes < unbounded_nodes and peak < unbounded_peak
+    if limit_mb is not None:
+        ok = ok and peak <= limit_mb * 2**20
+    return {
+        "max_tree_nodes": max_tree_nodes,
+        "playouts": playouts,
+        "node_count": node_count,
+        "peak_memory_mb": peak / 2**20,
+        "unbounded_node_count": unbounded_nodes,
+        "unbounded_peak_memory_mb": unbounded_peak / 2**20,
+        "memory_limit_mb": limit_mb,
+        "ok": ok,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(duration=1.0, playouts=2000, repeat=3, difficulty=2, names=None):
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "duration": duration,
+        "positions": {},
+    }
+    for name, plies in POSITIONS.items():
+        if names and name not in names:
+            continue
+        board, tile = make_position(plies)
+        entry = {"plies": plies, "empties": 64 - bb.popcount(board.stones[1] | board.stones[2])}
+        entry.update(bench_movegen(board, tile, duration))
+        entry.update(bench_playout(board, tile, duration))
+        entry.update(bench_search(board, tile, difficulty, playouts, repeat))
+        results["positions"][name] = entry
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reversi AI 引擎基准测试")
+    parser.add_argument("--duration", type=float, default=1.0, help="每项吞吐量测试的时长（秒）")
+    parser.add_argument("--playouts", type=int, default=2000, help="测量搜索延迟以及内存检查时每步的模拟次数")
+    parser.add_argument("--repeat", type=int, default=3, help="搜索延迟的重复次数，取中位数")
+    parser.add_argument("--difficulty", type=int, default=2, choices=(0, 1, 2), help="搜索使用的难度")
+    parser.add_argument("--position", action="append", choices=tuple(POSITIONS), help="只测试指定局面，可重复")
+    parser.add_argument("-o", "--output", help="结果写入的 JSON 文件，不指定时输出到标准输出")
+    parser.add_argument("--memory-check", action="store_true", help="只检查结点数上限下搜索的内存峰值，超出时返回 1")
+    parser.add_argument("--max-tree-nodes", type=int, default=500, help="内存检查使用的搜索树结点数上限")
+    parser.add_argument("--memory-limit", type=float, help="内存检查允许的峰值（MB），不指定时只与不限结点数的搜索比较")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.memory_check:
+        results = check_memory(args.max_tree_nodes, args.playouts, args.memory_limit, args.difficulty)
+    else:
+        results = run(args.duration, args.playouts, args.repeat, args.difficulty, args.position)
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.memory_check and not results["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
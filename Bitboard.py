@@ -0,0 +1,185 @@
+# 位棋盘：用两个 64 位整数分别记录白棋和黑棋
+# 第 i 行第 j 列对应第 i * 8 + j 位
+
+BOARD_SIZE = 8
+WHITE_NUM = 1
+BLACK_NUM = 2
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+# 去掉第 0 列和第 7 列，横向和斜向移位时防止跨行
+INNER_COLS = 0x7E7E7E7E7E7E7E7E
+
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+else:
+
+    def popcount(x):
+        return bin(x).count("1")
+
+
+class BitBoard:
+    __slots__ = ("stones",)
+
+    def __init__(self, white=0, black=0):
+        # 下标即棋子颜色，stones[1] 为白棋，stones[2] 为黑棋
+        self.stones = [0, white, black]
+
+    def copy(self):
+        return BitBoard(self.stones[WHITE_NUM], self.stones[BLACK_NUM])
+
+    # 在 sq 落子并翻转，返回翻转的棋子掩码，供 undo 还原
+    def play(self, tile, sq):
+        change = WHITE_NUM + BLACK_NUM - tile
+        flips = get_flips(self.stones[tile], self.stones[change], sq)
+        self.stones[tile] |= flips | (1 << sq)
+        self.stones[change] ^= flips
+        return flips
+
+    # 撤销 play 的落子
+    def undo(self, tile, sq, flips):
+        self.stones[tile] ^= flips | (1 << sq)
+        self.stones[WHITE_NUM + BLACK_NUM - tile] |= flips
+
+    # 返回 (i, j) 位置的棋子颜色，0 表示空
+    def get(self, i, j):
+        bit = 1 << square(i, j)
+        if self.stones[WHITE_NUM] & bit:
+            return WHITE_NUM
+        if self.stones[BLACK_NUM] & bit:
+            return BLACK_NUM
+        return 0
+
+    def __repr__(self):
+        rows = []
+        for i in range(BOARD_SIZE):
+            rows.append(" ".join(str(self.get(i, j)) for j in range(BOARD_SIZE)))
+        return "\n".join(rows)
+
+
+def opponent(tile):
+    return WHITE_NUM + BLACK_NUM - tile
+
+
+def square(i, j):
+    return i * BOARD_SIZE + j
+
+
+def to_position(sq):
+    return divmod(sq, BOARD_SIZE)
+
+
+# 依次返回所有置位的下标
+def iter_bits(x):
+    while x:
+        low = x & -x
+        yield low.bit_length() - 1
+        x ^= low
+
+
+def initial_board():
+    board = BitBoard()
+    board.stones[WHITE_NUM] = (1 << square(3, 3)) | (1 << square(4, 4))
+    board.stones[BLACK_NUM] = (1 << square(3, 4)) | (1 << square(4, 3))
+    return board
+
+
+# 从 grid[i][j] 形式的棋盘（0:空 1:白棋 2:黑棋）构造位棋盘
+def from_grid(grid):
+    board = BitBoard()
+    for i in range(BOARD_SIZE):
+        for j in range(BOARD_SIZE):
+            tile = grid[i][j]
+            if tile:
+                board.stones[tile] |= 1 << square(i, j)
+    return board
+
+
+# 移位方向及对应的对方棋子掩码，每个方向同时处理左移和右移
+# 1: 横向  8: 纵向  7/9: 斜向
+_SHIFTS = ((1, INNER_COLS), (8, FULL_MASK), (7, INNER_COLS), (9, INNER_COLS))
+
+
+# 返回 own 一方所有合法落子位置的掩码
+def get_moves(own, opp):
+    empty = ~(own | opp) & FULL_MASK
+    moves = 0
+    for s, m in _SHIFTS:
+        mm = opp & m
+        # 沿该方向连续经过对方棋子，最多 6 个
+        x = (own << s) & mm
+        x |= (x << s) & mm
+        x |= (x << s) & mm
+        x |= (x << s) & mm
+        x |= (x << s) & mm
+        x |= (x << s) & mm
+        moves |= (x << s) & empty
+
+        x = (own >> s) & mm
+        x |= (x >> s) & mm
+        x |= (x >> s) & mm
+        x |= (x >> s) & mm
+        x |= (x >> s) & mm
+        x |= (x >> s) & mm
+        moves |= (x >> s) & empty
+    return moves
+
+
+# 8 个方向的 (行, 列) 增量
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
+
+
+# 预先计算每个格子沿各方向到棋盘边缘的射线（不含该格子本身），每条射线为 (相邻格子, 射线掩码)
+# 下标递增方向的射线放在 RAYS_UP，递减方向的放在 RAYS_DOWN，只保留长度不少于 2 的射线
+def _build_rays():
+    rays_up = []
+    rays_down = []
+    neighbors = []
+    for sq in range(BOARD_SIZE * BOARD_SIZE):
+        i, j = to_position(sq)
+        up, down = [], []
+        around = 0
+        for di, dj in DIRECTIONS:
+            ray = []
+            x, y = i + di, j + dj
+            while 0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE:
+                ray.append(square(x, y))
+                x += di
+                y += dj
+            if ray:
+                around |= 1 << ray[0]
+            if len(ray) >= 2:
+                mask = sum(1 << r for r in ray)
+                (up if ray[0] > sq else down).append((1 << ray[0], mask))
+        rays_up.append(tuple(up))
+        rays_down.append(tuple(down))
+        neighbors.append(around)
+    return rays_up, rays_down, neighbors
+
+
+RAYS_UP, RAYS_DOWN, NEIGHBORS = _build_rays()
+
+
+# 返回 own 一方在 sq 落子时需要翻转的棋子掩码
+# 沿预先计算的射线找第一个不是对方棋子的格子，是己方棋子时中间的对方棋子全部翻转
+def get_flips(own, opp, sq):
+    # 周围没有对方棋子时不可能翻转
+    if not NEIGHBORS[sq] & opp:
+        return 0
+    flips = 0
+    for first, ray in RAYS_UP[sq]:
+        if not first & opp:
+            continue
+        blocker = ray & ~opp
+        # 下标递增方向上最近的是最低位
+        blocker &= -blocker
+        if blocker & own:
+            flips |= ray & (blocker - 1)
+    for first, ray in RAYS_DOWN[sq]:
+        if not first & opp:
+            continue
+        blocker = ray & ~opp
+        if blocker:
+            # 下标递减方向上最近的是最高位
+            blocker = 1 << (blocker.bit_length() - 1)
+            if blocker & own:
+                flips |= ray & -(blocker << 1)
+    return flips
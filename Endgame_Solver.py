@@ -0,0 +1,153 @@
+# 残局精确求解：空格较少时用带置换表的 negamax alpha-beta 搜索到终局
+# 返回最终棋子差最大的走法
+import time
+import Bitboard as bb
+
+# 置换表最多保存的局面数，超出后清空
+HASH_SIZE = 1 << 16
+# 空格数不少于该值时才写入置换表，更少的局面重新搜索更快
+HASH_MIN_EMPTIES = 5
+# 空格数不少于该值时按对手行动力排序，否则只按奇偶性排序
+MOBILITY_MIN_EMPTIES = 7
+
+# 棋盘四个象限的掩码，用于判断区域奇偶性
+QUADRANTS = (0x0F0F0F0F, 0xF0F0F0F0, 0x0F0F0F0F << 32, 0xF0F0F0F0 << 32)
+CORNERS = 0x8100000000000081
+# 每搜索这么多个结点检查一次是否超时
+DEADLINE_CHECK_NODES = 1024
+
+_hash = {}
+# 当前求解的截止时间和已搜索的结点数
+_deadline = None
+_nodes = 0
+
+
+# 求解超时，在 solve 中捕获
+class _Timeout(Exception):
+    pass
+
+
+def clear_hash():
+    _hash.clear()
+
+
+# 空格数为奇数的象限中的格子，在这些区域落子可以抢到最后一手
+def _odd_regions(empty):
+    odd = 0
+    for quadrant in QUADRANTS:
+        if bb.popcount(empty & quadrant) & 1:
+            odd |= quadrant
+    return odd
+
+
+# 对走法排序：先角，再奇数区域，空格多时再按落子后对手的行动力从少到多
+def _ordered_moves(own, opp, moves, empties, best=-1):
+    empty = ~(own | opp) & bb.FULL_MASK
+    odd = _odd_regions(empty)
+    scored = []
+    for sq in bb.iter_bits(moves):
+        bit = 1 << sq
+        score = 0
+        if sq == best:
+            score -= 1000
+        if bit & CORNERS:
+            score -= 100
+        if bit & odd:
+            score -= 10
+        if empties >= MOBILITY_MIN_EMPTIES:
+            flips = bb.get_flips(own, opp, sq)
+            score += bb.popcount(bb.get_moves(opp ^ flips, own | flips | bit))
+        scored.append((score, sq))
+    scored.sort()
+    return [sq for _, sq in scored]
+
+
+# 返回 own 一方在双方最优下法下的最终棋子差
+def _negamax(own, opp, alpha, beta, passed):
+    global _nodes
+    _nodes += 1
+    if _deadline is not None and _nodes % DEADLINE_CHECK_NODES == 0 and time.perf_counter() >= _deadline:
+        raise _Timeout()
+    moves = bb.get_moves(own, opp)
+    if not moves:
+        if passed:
+            return bb.popcount(own) - bb.popcount(opp)
+        return -_negamax(opp, own, -beta, -alpha, True)
+
+    empties = 64 - bb.popcount(own | opp)
+    key = None
+    best_sq = -1
+    if empties >= HASH_MIN_EMPTIES:
+        key = (own, opp)
+        entry = _hash.get(key)
+        if entry is not None:
+            lower, upper, best_sq = entry
+            if lower >= beta:
+                return lower
+            if upper <= alpha:
+                return upper
+            if lower > alpha:
+                alpha = lower
+            if upper < beta:
+                beta = upper
+
+    alpha_orig = alpha
+    best = -65
+    for sq in _ordered_moves(own, opp, moves, empties, best_sq):
+        flips = bb.get_flips(own, opp, sq)
+        value = -_negamax(opp ^ flips, own | flips | (1 << sq), -beta, -alpha, False)
+        if value > best:
+            best = value
+            best_sq = sq
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+
+    if key is not None:
+        if len(_hash) >= HASH_SIZE:
+            _hash.clear()
+        if best <= alpha_orig:
+            _hash[key] = (-65, best, best_sq)
+        elif best >= beta:
+            _hash[key] = (best, 65, best_sq)
+        else:
+            _hash[key] = (best, best, best_sq)
+    return best
+
+
+def empty_count(board):
+    return 64 - bb.popcount(board.stones[bb.WHITE_NUM] | board.stones[bb.BLACK_NUM])
+
+
+# 求解 tile 一方的最佳走法，返回 (位置 0-63, 最终棋子差)，无子可下时位置为 -1
+# deadline 为 time.perf_counter() 的截止时间，到时还没解完返回 None，置换表中已完成的结果保留
+def solve(board, tile, deadline=None):
+    global _deadline, _nodes
+    _deadline = deadline
+    _nodes = 0
+    try:
+        return _solve(board, tile)
+    except _Timeout:
+        return None
+    finally:
+        _deadline = None
+
+
+def _solve(board, tile):
+    own = board.stones[tile]
+    opp = board.stones[bb.opponent(tile)]
+    moves = bb.get_moves(own, opp)
+    if not moves:
+        return -1, -_negamax(opp, own, -65, 65, True)
+
+    empties = empty_count(board)
+    best_sq = -1
+    alpha = -65
+    for sq in _ordered_moves(own, opp, moves, empties):
+        flips = bb.get_flips(own, opp, sq)
+        value = -_negamax(opp ^ flips, own | flips | (1 << sq), -65, -alpha, False)
+        if value > alpha:
+            alpha = value
+            best_sq = sq
+    return best_sq, alpha
@@ -0,0 +1,181 @@
+# 紧凑的二进制棋谱格式：每步棋只记一个字节的位置，思考时间以毫秒记
+# 写入端逐局追加，读取端是生成器，遍历上百万局也不需要整体载入内存
+# 用法: python Game_Record.py games.rvgr --replay
+#
+# 文件格式（小端）:
+#   文件头: 魔数 b"RVGR", 版本 u16
+#   每局:   白棋引擎 u8, 黑棋引擎 u8, 白棋难度 u8, 黑棋难度 u8（0xFF 表示无）, 随机种子 u32,
+#           白棋子数 u8, 黑棋子数 u8, 步数 u8,
+#           每步的位置 u8 * 步数, 每步的思考时间（毫秒）u16 * 步数
+#   无子可下时的让步不记录，回放时按规则推出轮到哪一方
+import argparse
+import os
+import struct
+import Bitboard as bb
+
+MAGIC = b"RVGR"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<BBBBIBBB")
+# 引擎编号即在此元组中的下标
+ENGINES = ("human", "mcts", "random")
+NO_DIFFICULTY = 0xFF
+MAX_THINK_MS = 0xFFFF
+
+WHITE_NUM = bb.WHITE_NUM
+BLACK_NUM = bb.BLACK_NUM
+
+
+class GameRecord:
+    def __init__(self, engines, difficulties, seed=0, moves=None, white_num=0, black_num=0):
+        # 以颜色为键的引擎名和难度，难度可以为 None
+        self.engines = engines
+        self.difficulties = difficulties
+        self.seed = seed
+        # 每步棋: (位置 0-63, 思考时间 秒)
+        self.moves = moves if moves is not None else []
+        self.white_num = white_num
+        self.black_num = black_num
+
+    def __repr__(self):
+        return "GameRecord(白棋 {}, 黑棋 {}, {} 步, {}:{})".format(
+            self.engines[WHITE_NUM], self.engines[BLACK_NUM], len(self.moves), self.white_num, self.black_num)
+
+
+# 由 Headless.GameResult 生成棋谱
+def from_game(game, engines, difficulties, seed=0):
+    moves = [(sq, cost) for tile, sq, cost in game.moves]
+    return GameRecord(engines, difficulties, seed, moves, game.white_num, game.black_num)
+
+
+def _engine_code(name):
+    try:
+        return ENGINES.index(name)
+    except ValueError:
+        raise ValueError("未知的引擎: {}".format(name))
+
+
+def pack(record):
+    difficulty = [NO_DIFFICULTY if record.difficulties[tile] is None else record.difficulties[tile]
+                  for tile in (WHITE_NUM, BLACK_NUM)]
+    count = len(record.moves)
+    header = RECORD.pack(
+        _engine_code(record.engines[WHITE_NUM]), _engine_code(record.engines[BLACK_NUM]), difficulty[0], difficulty[1],
+        (record.seed or 0) & 0xFFFFFFFF, record.white_num, record.black_num, count,
+    )
+    squares = bytes(sq for sq, _ in record.moves)
+    think = struct.pack("<{}H".format(count), *(min(round(cost * 1000), MAX_THINK_MS) for _, cost in record.moves))
+    return header + squares + think
+
+
+# 追加写入棋谱文件，文件为空时先写文件头
+class RecordWriter:
+    def __init__(self, path):
+        if os.path.exists(path) and os.path.getsize(path):
+            with open(path, "rb") as f:
+                _check_header(f.read(HEADER.size), path)
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION))
+
+    def write(self, record):
+        self._file.write(pack(record))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _check_header(data, path):
+    if len(data) != HEADER.size:
+        raise ValueError("不是有效的棋谱文件: {}".format(path))
+    magic, version = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("不是有效的棋谱文件: {}".format(path))
+
+
+# 逐局读取棋谱文件的生成器
+def read_records(path):
+    with open(path, "rb") as f:
+        _check_header(f.read(HEADER.size), path)
+        while True:
+            data = f.read(RECORD.size)
+            if not data:
+                return
+            if len(data) != RECORD.size:
+                raise ValueError("棋谱文件不完整: {}".format(path))
+            white, black, white_difficulty, black_difficulty, seed, white_num, black_num, count = RECORD.unpack(data)
+            body = f.read(count * 3)
+            if len(body) != count * 3:
+                raise ValueError("棋谱文件不完整: {}".format(path))
+            think = struct.unpack_from("<{}H".format(count), body, count)
+            yield GameRecord(
+                {WHITE_NUM: ENGINES[white], BLACK_NUM: ENGINES[black]},
+                {WHITE_NUM: None if white_difficulty == NO_DIFFICULTY else white_difficulty,
+                 BLACK_NUM: None if black_difficulty == NO_DIFFICULTY else black_difficulty},
+                seed,
+                [(body[k], think[k] / 1000) for k in range(count)],
+                white_num,
+                black_num,
+            )
+
+
+# 按规则回放棋谱，依次返回每步落子前的 (棋盘, 轮到下棋的一方, 位置)
+# 返回的是同一个棋盘对象，需要保留局面时请 copy()，走法不合法时抛出 ValueError
+def replay(record):
+    board = bb.initial_board()
+    tile = BLACK_NUM
+    for ply, (sq, _) in enumerate(record.moves):
+        moves = bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)])
+        if not moves:
+            tile = bb.opponent(tile)
+            moves = bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)])
+        if not moves >> sq & 1:
+            raise ValueError("第 {} 步不合法: {}".format(ply + 1, bb.to_position(sq)))
+        yield board, tile, sq
+        board.play(tile, sq)
+        tile = bb.opponent(tile)
+
+
+# 回放整局并返回终局棋盘，检查终局子数与记录一致
+def final_board(record):
+    board = bb.initial_board()
+    # 生成器结束时最后一步已经落下
+    for board, tile, sq in replay(record):
+        pass
+    if (bb.popcount(board.stones[WHITE_NUM]), bb.popcount(board.stones[BLACK_NUM])) != (record.white_num, record.black_num):
+        raise ValueError("终局子数与记录不一致: {}".format(record))
+    return board
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="查看 Reversi AI 棋谱文件")
+    parser.add_argument("path", help="棋谱文件")
+    parser.add_argument("--replay", action="store_true", help="按规则回放每一局，检查棋谱是否合法")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    games = white_win = black_win = moves = 0
+    for record in read_records(args.path):
+        if args.replay:
+            final_board(record)
+        games += 1
+        moves += len(record.moves)
+        white_win += record.white_num > record.black_num
+        black_win += record.black_num > record.white_num
+    print("共 {} 局, {} 步, 白棋赢 {} 局, 黑棋赢 {} 局, 和棋 {} 局".format(
+        games, moves, white_win, black_win, games - white_win - black_win))
+
+
+if __name__ == "__main__":
+    main()
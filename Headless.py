@@ -0,0 +1,173 @@
+# 无图形界面的批量对局，可在 Linux 服务器上运行
+# 用法: python Headless.py -n 100 --white mcts --black random --difficulty HARD
+import argparse
+import random
+import time
+import MCTS_Algorithm as rvs
+import Bitboard as bb
+import Game_Record
+
+WHITE_NUM = bb.WHITE_NUM
+BLACK_NUM = bb.BLACK_NUM
+ENGINES = ("mcts", "random")
+DIFFICULTIES = {"EASY": 0, "MEDIUM": 1, "HARD": 2}
+COLOR_NAME = {WHITE_NUM: "白棋", BLACK_NUM: "黑棋"}
+
+
+# 多局对局的统计结果
+class Result:
+    def __init__(self):
+        self.white_num = 0
+        self.black_num = 0
+        self.loop = 0
+        self.white_win = 0
+        self.black_win = 0
+        self.no_win = 0
+
+    def add(self, white_num, black_num):
+        self.white_num += white_num
+        self.black_num += black_num
+        self.loop += 1
+        self.white_win += white_num > black_num
+        self.black_win += white_num < black_num
+        self.no_win += white_num == black_num
+
+    def __str__(self):
+        # fmt: off
+        return "\n".join([
+            "共下 {} 局, 白棋赢 {} 局, 黑棋赢 {} 局，和棋 {} 局".format(self.loop, self.white_win, self.black_win, self.no_win),
+            "白棋共有: {}, 平均每局: {}".format(self.white_num, self.white_num / self.loop),
+            "黑棋共有: {}, 平均每局: {}".format(self.black_num, self.black_num / self.loop),
+        ])
+        # fmt: on
+
+
+# 单局对局的结果
+class GameResult:
+    def __init__(self):
+        self.white_num = 0
+        self.black_num = 0
+        # 每步棋: (颜色, 位置 0-63, 耗时)
+        self.moves = []
+        # 每种颜色的总耗时
+        self.think_time = {WHITE_NUM: 0.0, BLACK_NUM: 0.0}
+
+    @property
+    def winner(self):
+        if self.white_num > self.black_num:
+            return WHITE_NUM
+        if self.black_num > self.white_num:
+            return BLACK_NUM
+        return 0
+
+
+# 根据引擎类型选择下一步棋，返回 (row, col)
+def choose_move(engine, board, tile, difficulty, think_time=None):
+    if engine == "random":
+        return random.choice(rvs.possible_positions(board, tile))
+    if engine == "mcts":
+        return rvs.mctsNextPosition(board, difficulty, think_time=think_time, tile=tile)
+    raise ValueError("未知的引擎: {}".format(engine))
+
+
+# 下一局棋，黑棋先行，engines / difficulties 均以颜色为键
+# opening_plies: 开局的前几步随机落子，使批量对局的开局各不相同
+def play_game(engines, difficulties, think_time=None, verbose=False, opening_plies=0):
+    board = rvs.getInitialBoard()
+    game = GameResult()
+    tile = BLACK_NUM
+    rvs.reset_tree()
+
+    while True:
+        if not rvs.possible_positions(board, tile):
+            if not rvs.possible_positions(board, bb.opponent(tile)):
+                if verbose:
+                    print("双方都无子可下，棋局结束")
+                break
+            if verbose:
+                print("{}当前无子可下，{}再下一回合".format(COLOR_NAME[tile], COLOR_NAME[bb.opponent(tile)]))
+            tile = bb.opponent(tile)
+            continue
+
+        start_time = time.perf_counter()
+        if len(game.moves) < opening_plies:
+            row, col = choose_move("random", board, tile, difficulties[tile])
+        else:
+            row, col = choose_move(engines[tile], board, tile, difficulties[tile], think_time)
+        cost = time.perf_counter() - start_time
+        rvs.updateBoard(board, tile, row, col)
+        game.moves.append((tile, bb.square(row, col), cost))
+        game.think_time[tile] += cost
+        if verbose:
+            print("{}落子 [{}, {}], 此步耗时: {:.6} 秒".format(COLOR_NAME[tile], row, col, cost))
+        tile = bb.opponent(tile)
+
+    game.white_num = rvs.countTile(board, WHITE_NUM)
+    game.black_num = rvs.countTile(board, BLACK_NUM)
+    return game
+
+
+# writer: Game_Record.RecordWriter，不为 None 时每局棋谱写入其中，该局的随机种子一并记录
+# seed: 第一局的随机种子，之后每局加一，每局开始前重新设置，不指定时随机选取
+def run_games(loop, engines, difficulties, think_time=None, verbose=False, writer=None, seed=None):
+    result = Result()
+    who_win = lambda a, b: ("白棋赢" if a > b else ("黑棋赢" if b > a else "平局"))
+    if seed is None:
+        seed = random.randrange(0, 2**32)
+    while result.loop < loop:
+        game_seed = (seed + result.loop) & 0xFFFFFFFF
+        random.seed(game_seed)
+        game = play_game(engines, difficulties, think_time, verbose)
+        if writer is not None:
+            writer.write(Game_Record.from_game(game, engines, difficulties, game_seed))
+        # fmt: off
+        print("白棋:{}, 黑棋:{}, {}\n白棋总耗时: {:.6} 秒, 黑棋总耗时: {:.6} 秒".format(
+            game.white_num, game.black_num, who_win(game.white_num, game.black_num),
+            game.think_time[WHITE_NUM], game.think_time[BLACK_NUM]))
+        # fmt: on
+        result.add(game.white_num, game.black_num)
+    return result
+
+
+def parse_difficulty(value):
+    if value.upper() in DIFFICULTIES:
+        return DIFFICULTIES[value.upper()]
+    if value.isdigit() and int(value) in DIFFICULTIES.values():
+        return int(value)
+    raise argparse.ArgumentTypeError("难度应为 EASY/MEDIUM/HARD 或 0/1/2")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reversi AI 无界面批量对局")
+    parser.add_argument("-n", "--games", type=int, default=1, help="棋局总数")
+    parser.add_argument("--white", choices=ENGINES, default="mcts", help="白棋引擎")
+    parser.add_argument("--black", choices=ENGINES, default="random", help="黑棋引擎")
+    parser.add_argument("--difficulty", type=parse_difficulty, default=0, help="双方 AI 难度")
+    parser.add_argument("--white-difficulty", type=parse_difficulty, help="白棋 AI 难度")
+    parser.add_argument("--black-difficulty", type=parse_difficulty, help="黑棋 AI 难度")
+    parser.add_argument("--think-time", type=float, help="AI 每步思考时间（秒），不指定时按难度的模拟次数")
+    parser.add_argument("--seed", type=int, help="第一局的随机种子，之后每局加一")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出每一步棋")
+    parser.add_argument("--record", help="逐局追加写入的棋谱文件")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engines = {WHITE_NUM: args.white, BLACK_NUM: args.black}
+    difficulties = {
+        WHITE_NUM: args.difficulty if args.white_difficulty is None else args.white_difficulty,
+        BLACK_NUM: args.difficulty if args.black_difficulty is None else args.black_difficulty,
+    }
+    writer = Game_Record.RecordWriter(args.record) if args.record else None
+    try:
+        result = run_games(args.games, engines, difficulties, args.think_time, args.verbose, writer, args.seed)
+    finally:
+        if writer:
+            writer.close()
+    print(result)
+    rvs.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,282 +1,857 @@
 import random
 import math
 import time
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import Bitboard as bb
+import Batch_Playout
+import Transposition
+import Endgame_Solver
+import Opening_Book
+import Symmetry
+import Playout_Policy
+import Pattern_Eval
 
 BOARD_SIZE = 8
 PLAYER_NUM = 2
 COMPUTER_NUM = 1
 MAX_THINK_TIME = 60
-direction = [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]
+MCTS_WORKERS = 1
+TREE_REUSE = True
+# 置换表大小，0 表示不使用置换表
+TT_SIZE = 1 << 16
+# 是否查询默认开局库 Opening_Book.DEFAULT_PATH（文件存在时）
+USE_BOOK = True
+# 模拟的最大步数下标，到达后按棋子数或模式评估判断胜负
+PLAYOUT_DEPTH = 32
+# 指定思考时间时残局求解最多使用的时间比例
+ENDGAME_TIME_FRACTION = 0.5
+# 每种颜色搜索树的结点数上限，结点池满时裁剪访问次数最少的子树，0 表示不限制
+TREE_NODE_LIMIT = 1 << 18
+# 裁剪时回收到空闲结点不少于上限的这一比例
+PRUNE_FRACTION = 0.25
 
 
 # 初始化棋盘数组
 def getInitialBoard():
-    board = {}
+    board = bb.BitBoard()
 
-    for i in range(0, BOARD_SIZE):
-        board[i] = {}
+    board.stones[COMPUTER_NUM] |= 1 << bb.square(BOARD_SIZE // 2 - 1, BOARD_SIZE // 2 - 1)
+    board.stones[COMPUTER_NUM] |= 1 << bb.square(BOARD_SIZE // 2, BOARD_SIZE // 2)
 
-        for j in range(0, BOARD_SIZE):
-            board[i][j] = 0
-
-    board[BOARD_SIZE / 2 - 1][BOARD_SIZE / 2 - 1] = COMPUTER_NUM
-    board[BOARD_SIZE / 2][BOARD_SIZE / 2] = COMPUTER_NUM
-
-    board[BOARD_SIZE / 2 - 1][BOARD_SIZE / 2] = PLAYER_NUM
-    board[BOARD_SIZE / 2][BOARD_SIZE / 2 - 1] = PLAYER_NUM
+    board.stones[PLAYER_NUM] |= 1 << bb.square(BOARD_SIZE // 2 - 1, BOARD_SIZE // 2)
+    board.stones[PLAYER_NUM] |= 1 << bb.square(BOARD_SIZE // 2, BOARD_SIZE // 2 - 1)
 
     return board
 
 
 # 返回棋子数
 def countTile(board, tile):
-    stones = 0
-    for i in range(0, BOARD_SIZE):
-        for j in range(0, BOARD_SIZE):
-            if board[i][j] == tile:
-                stones += 1
-
-    return stones
+    return bb.popcount(board.stones[tile])
 
 
 # 返回一个颜色棋子可能的下棋位置
 def possible_positions(board, tile):
-    positions = []
-    for i in range(0, BOARD_SIZE):
-        for j in range(0, BOARD_SIZE):
-            if board[i][j] != 0:
-                continue
-            if updateBoard(board, tile, i, j, checkonly=True) > 0:
-                positions.append((i, j))
-    return positions
+    moves = bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)])
+    return [bb.to_position(sq) for sq in bb.iter_bits(moves)]
 
-def isOnBoard(x, y):
-    return x >= 0 and x <= 7 and y >= 0 and y <= 7
+# 是否是合法走法，返回需要翻转的棋子数，checkonly 为 False 时同时落子并翻转
+def updateBoard(board, tile, i, j, checkonly=False):
+    sq = bb.square(i, j)
+    bit = 1 << sq
+    change = bb.opponent(tile)
+    # 该位置已经有棋子，不能下
+    if (board.stones[tile] | board.stones[change]) & bit:
+        return 0
+
+    flips = bb.get_flips(board.stones[tile], board.stones[change], sq)
+    # 没有要被翻转的棋子，则走法非法。翻转棋的规则。
+    if flips and not checkonly:
+        board.play(tile, sq)
+    return bb.popcount(flips)
+
+
+# 不断随机下棋，返回最终谁赢了，me 一方赢了True，只在局部变量上落子，不修改棋盘
+# policy: Playout_Policy.Policy，前 policy.budget 步按策略选择走法，None 时均匀随机
+# max_depth: 模拟到第 max_depth 步为止，为 -1 时不模拟
+# evaluate(own, opp): 到达 max_depth 时对局还没结束则用它估计轮到下棋一方的胜率，返回 me 一方的胜率
+# played: 不为 None 时按颜色记录双方在模拟中落子的位置掩码，供 RAVE 使用
+def find_playout(tep_board, tile, me=COMPUTER_NUM, depth=0, policy=None, max_depth=PLAYOUT_DEPTH, evaluate=None,
+                 played=None):
+    own = tep_board.stones[tile]
+    opp = tep_board.stones[bb.opponent(tile)]
+    get_moves = bb.get_moves
+    get_flips = bb.get_flips
+    popcount = bb.popcount
+    choose = None
+    policy_end = depth
+    if policy is not None and policy.choose is not None:
+        choose = policy.choose
+        policy_end = depth + policy.budget
+
+    while depth <= max_depth:
+        moves = get_moves(own, opp)
 
+        # 查看是否可以在这个位置下棋
+        if not moves:
+            moves = get_moves(opp, own)
+            if not moves:
+                break
+            own, opp = opp, own
+            tile = bb.opponent(tile)
 
-# 是否是合法走法，如果合法返回需要翻转的棋子列表
-def updateBoard(board, tile, i, j, checkonly=False):
-    # 该位置已经有棋子或者出界了，返回False
-    reversed_stone = 0
+        if choose is not None and depth < policy_end:
+            sq = choose(own, opp, moves)
+        else:
+            # 随机放置一个棋子
+            for _ in range(random.randrange(0, popcount(moves))):
+                moves &= moves - 1
+            sq = (moves & -moves).bit_length() - 1
+        flips = get_flips(own, opp, sq)
+        own |= flips | (1 << sq)
+        opp ^= flips
+        if played is not None:
+            played[tile] |= 1 << sq
 
-    # 临时将tile 放到指定的位置
-    board[i][j] = tile
-    if tile == 2:
-        change = 1
+        # 转换轮次
+        own, opp = opp, own
+        tile = bb.opponent(tile)
+        depth += 1
     else:
-        change = 2
-
-    # 要被翻转的棋子
-    need_turn = []
-    for xdirection, ydirection in direction:
-        x, y = i, j
-        x += xdirection
-        y += ydirection
-        if isOnBoard(x, y) and board[x][y] == change:
-            x += xdirection
-            y += ydirection
-            if not isOnBoard(x, y):
-                continue
-            # 一直走到出界或不是对方棋子的位置
-            while board[x][y] == change:
-                x += xdirection
-                y += ydirection
-                if not isOnBoard(x, y):
-                    break
-            # 出界了，则没有棋子要翻转
-            if not isOnBoard(x, y):
-                continue
-            # 是自己的棋子，中间的所有棋子都要翻转
-            if board[x][y] == tile:
-                while True:
-                    x -= xdirection
-                    y -= ydirection
-                    # 回到了起点则结束
-                    if x == i and y == j:
-                        break
-                    # 需要翻转的棋子
-                    need_turn.append([x, y])
-    # 将前面临时放上的棋子去掉，即还原棋盘
-    board[i][j] = 0  # restore the empty space
-    # 没有要被翻转的棋子，则走法非法。翻转棋的规则。
-    for x, y in need_turn:
-        if not (checkonly):
-            board[i][j] = tile
-            board[x][y] = tile  # 翻转棋子
-        reversed_stone += 1
-    return reversed_stone
+        # 到达步数上限时对局还没结束
+        if evaluate is not None:
+            rate = evaluate(own, opp)
+            return rate if tile == me else 1 - rate
+
+    if tile != me:
+        own, opp = opp, own
+    return popcount(own) > popcount(opp)
+
+
+# 难度参数: 模拟次数, 电脑和玩家的 UCB 常数, 空格数不超过 endgame_empties 时改用残局精确求解（0 表示不使用）,
+# 模拟策略名（见 Playout_Policy.POLICIES）, RAVE 的等价参数 rave_k（0 表示不使用 RAVE）,
+# 是否查询开局库 use_book（开局库按 HARD 的强度生成，低难度不使用）
+# rave_k: 结点模拟次数远小于它时主要参考 AMAF 统计，远大于它时主要参考自身统计；黑白棋中同一位置的价值
+# 随局面变化大，AMAF 统计偏差较大，取值大时反而变弱，各难度默认不使用，需要时建议取 10 左右
+DifficultyParam = namedtuple(
+    "DifficultyParam",
+    ["loops", "cval_computer", "cval_player", "endgame_empties", "playout_policy", "rave_k", "use_book"],
+)
+
+
+def get_difficulty_param(difficulty):
+    EASY = DifficultyParam(2000, 1, -1, 0, "uniform", 0, False)
+    MEDIUM = DifficultyParam(2000, 0.5, 0.1, 10, "square", 0, True)
+    HARD = DifficultyParam(2000, 0.1, -0.1, 12, "mobility", 0, True)
+    if difficulty == 0:
+        return EASY
+    if difficulty == 1:
+        return MEDIUM
+    if difficulty == 2:
+        return HARD
+
+
+# 搜索树结点，move 为到达该结点的落子位置（0-63），根结点为 -1
+# key 为落子后局面规范形式的 Zobrist 哈希，结点第一次被选中时计算，0 表示尚未计算
+# amaf_n / amaf_w 为 RAVE 的 AMAF 统计：父结点之后的模拟中同一方在 move 落过子的次数及其中的奖励
+class Node:
+    __slots__ = ("move", "nplayout", "reward", "children", "parent", "key", "amaf_n", "amaf_w")
+
+    def __init__(self, move=-1, parent=None):
+        self.move = move
+        self.nplayout = 0
+        self.reward = 0
+        self.children = []
+        self.parent = parent
+        self.key = 0
+        self.amaf_n = 0
+        self.amaf_w = 0
+
+
+# 结点池：按需创建结点，最多 capacity 个，回收的结点放回空闲列表重复使用
+# 一个结点池只服务于一种颜色的搜索树，整棵树不再使用时用 clear() 全部回收
+class NodePool:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.nodes = []
+        self.free = []
+        # 正在使用该结点池搜索时为 True，此时不能 clear()
+        self.searching = False
+
+    # 正在使用的结点数
+    def __len__(self):
+        return len(self.nodes) - len(self.free)
+
+    def available(self):
+        return self.capacity - len(self)
+
+    # 取一个结点，池满时返回 None
+    def new(self, move=-1, parent=None):
+        if self.free:
+            node = self.free.pop()
+            node.__init__(move, parent)
+            return node
+        if len(self.nodes) < self.capacity:
+            node = Node(move, parent)
+            self.nodes.append(node)
+            return node
+        return None
+
+    # 回收 node 的所有后代，node 保留自身统计成为叶结点，返回回收的结点数
+    def release_children(self, node):
+        stack = node.children
+        node.children = []
+        count = 0
+        while stack:
+            child = stack.pop()
+            stack.extend(child.children)
+            child.children = []
+            child.parent = None
+            self.free.append(child)
+            count += 1
+        return count
+
+    # 回收 node 及其所有后代
+    def release(self, node):
+        count = self.release_children(node) + 1
+        node.parent = None
+        self.free.append(node)
+        return count
+
+    def clear(self):
+        if self.searching:
+            raise RuntimeError("搜索进行中，不能回收整个结点池")
+        self.free = list(self.nodes)
+
+    # 按访问次数从少到多回收 root 树中内部结点的子树，直到空闲结点不少于 target，
+    # keep 及其祖先不裁剪，返回回收的结点数
+    def prune(self, root, keep, target):
+        protected = set()
+        node = keep
+        while node is not None:
+            protected.add(id(node))
+            node = node.parent
+        candidates = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node.children:
+                if id(node) not in protected:
+                    candidates.append(node)
+                stack.extend(node.children)
+        candidates.sort(key=lambda node: node.nplayout)
+        count = 0
+        for node in candidates:
+            if self.available() >= target:
+                break
+            # 祖先先被裁剪时 children 已被清空
+            count += self.release_children(node)
+        return count
+
+
+# 每种颜色的结点池，与 _trees 中该颜色的搜索树对应
+_node_pools = {}
+
+
+# 取得 tile 一方容量为 capacity 的结点池，容量变化时丢弃原有的树，capacity 为 0 时返回 None
+def get_node_pool(tile, capacity):
+    pool = _node_pools.get(tile)
+    if pool is not None and pool.capacity != capacity:
+        _trees.pop(tile, None)
+        pool = None
+    if pool is None and capacity:
+        pool = _node_pools[tile] = NodePool(capacity)
+    elif not capacity:
+        _node_pools.pop(tile, None)
+    return pool
+
+
+# 每种颜色的置换表: {颜色: (大小, 置换表)}，与 _trees 中该颜色的搜索树一起沿用，新建搜索树时丢弃
+_tables = {}
+
+
+# 取得 tile 一方大小为 size 的置换表，大小变化时新建，size 为 0 时返回 None
+def get_table(tile, size):
+    entry = _tables.get(tile)
+    if entry is None or entry[0] != size:
+        entry = _tables[tile] = (size, Transposition.TranspositionTable(size) if size else None)
+    return entry[1]
+
+
+# 一次搜索的统计信息，可传给 mctsNextPosition 的 stats 参数，或通过 add_stats_hook 注册回调获取
+# peak_memory 为搜索中 tracemalloc 记录的内存峰值（字节），trace_memory 为 True 时在搜索期间启动 tracemalloc，
+# 否则仅在调用方已启动 tracemalloc 时记录；tracemalloc 会让搜索慢很多，默认不启用
+class SearchStats:
+    PHASES = ("selection", "expansion", "simulation", "backprop")
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.source = "mcts"  # 走法来源: mcts / book / endgame
+        self.move = None
+        self.elapsed = 0.0
+        self.iterations = 0
+        self.playouts = 0
+        self.node_count = 0
+        self.max_depth = 0
+        self.peak_memory = None
+        self.phase_time = dict.fromkeys(self.PHASES, 0.0)
+        # 根结点各子结点: (位置, 模拟次数, 奖励)
+        self.children = []
+
+    @property
+    def playouts_per_sec(self):
+        return self.playouts / self.elapsed if self.elapsed > 0 else 0.0
+
+    # 合并根并行中另一棵树的统计
+    def merge(self, other):
+        self.iterations += other.iterations
+        self.playouts += other.playouts
+        self.node_count += other.node_count
+        self.max_depth = max(self.max_depth, other.max_depth)
+        if other.peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, other.peak_memory)
+        for phase in self.PHASES:
+            self.phase_time[phase] += other.phase_time[phase]
+
+    def as_dict(self):
+        return {
+            "source": self.source,
+            "move": self.move,
+            "elapsed": self.elapsed,
+            "iterations": self.iterations,
+            "playouts": self.playouts,
+            "playouts_per_sec": self.playouts_per_sec,
+            "node_count": self.node_count,
+            "max_depth": self.max_depth,
+            "peak_memory": self.peak_memory,
+            "phase_time": dict(self.phase_time),
+            "children": [
+                {"move": pos, "visits": n, "win_rate": w / n if n else 0.0} for pos, n, w in self.children
+            ],
+        }
+
+    def __str__(self):
+        if self.source != "mcts":
+            return "走法来源: {}, 耗时 {:.4f} 秒".format(self.source, self.elapsed)
+        phases = ", ".join("{} {:.3f}".format(phase, self.phase_time[phase]) for phase in self.PHASES)
+        text = "模拟 {} 次 ({:.0f} 次/秒), 结点 {} 个, 最大深度 {}, 各阶段耗时: {}".format(
+            self.playouts, self.playouts_per_sec, self.node_count, self.max_depth, phases)
+        if self.peak_memory is not None:
+            text += ", 内存峰值 {:.2f} MB".format(self.peak_memory / 2**20)
+        return text
+
+
+# 每次 mctsNextPosition 返回前以 SearchStats 调用的回调
+stats_hooks = []
+
+
+def add_stats_hook(hook):
+    stats_hooks.append(hook)
+
+
+def remove_stats_hook(hook):
+    stats_hooks.remove(hook)
+
+
+def count_nodes(root):
+    count = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+
+# 扩展子结点，unique 为 True 时落子后互相对称的走法只保留一个
+# pool 不为 None 时从结点池中取结点，空闲结点不够时返回 None
+def expand(tep_board, tile, parent=None, unique=False, pool=None):
+    moves = bb.get_moves(tep_board.stones[tile], tep_board.stones[bb.opponent(tile)])
+    if unique:
+        moves = Symmetry.unique_moves(tep_board, tile, moves)
+    if pool is None:
+        return [Node(sq, parent) for sq in bb.iter_bits(moves)]
+    if pool.available() < bb.popcount(moves):
+        return None
+    return [pool.new(sq, parent) for sq in bb.iter_bits(moves)]
 
 
 # 蒙特卡洛树搜索
-def mctsNextPosition(board, difficulty):
-    def get_difficulty_param(difficulty):
-        EASY = (2000, 1, -1)
-        MEDIUM = (2000, 0.5, 0.1)
-        HARD = (2000, 0.1, -0.1)
-        if difficulty == 0:
-            return EASY
-        if difficulty == 1:
-            return MEDIUM
-        if difficulty == 2:
-            return HARD
-
-    def ucb1(node_tuple, t, cval):
-        name, nplayout, reward, childrens = node_tuple
+# think_time: 思考时间（秒），到时即返回当前最优走法，不超过 MAX_THINK_TIME
+# max_playouts / max_nodes: 模拟次数和树结点数上限（沿用的树中已有的结点也计入），均未指定时按难度的模拟次数搜索
+# workers: 根并行的进程数，默认为 MCTS_WORKERS，大于 1 时每个进程独立建树后合并根结点统计
+# reuse_tree: 是否沿用上一步的搜索树，默认为 TREE_REUSE，仅单进程搜索时有效
+# leaf_playouts: 每次选中叶结点后进行的模拟局数，大于 1 且安装了 NumPy 时批量模拟
+# tile: 由 AI 执子的颜色，默认为白棋 COMPUTER_NUM
+# tt_size: 置换表大小，默认为 TT_SIZE，0 表示不使用
+# endgame_empties: 空格数不超过该值时改用残局精确求解，默认取难度参数
+# use_book: 是否先查询开局库，默认在 USE_BOOK 为 True 时取难度参数
+# stats: 传入 SearchStats 时记录本次搜索的统计信息，注册了 stats_hooks 时自动记录
+# playout_policy: 模拟策略名，默认取难度参数
+# pattern_eval: 为 True 时模拟到 playout_depth 步后用 Pattern_Eval 的默认权重估计胜率，而不是比较棋子数
+# playout_depth: 模拟的最大步数下标，默认为 PLAYOUT_DEPTH，与 pattern_eval 一起使用时为 -1 表示不模拟直接评估
+# rave_k: RAVE 的等价参数，默认取难度参数，0 表示不使用
+# max_tree_nodes: 搜索树结点数上限，默认为 TREE_NODE_LIMIT，0 表示不限制
+def mctsNextPosition(board, difficulty, think_time=None, max_playouts=None, max_nodes=None, workers=None, reuse_tree=None,
+                     leaf_playouts=1, tile=COMPUTER_NUM, tt_size=None, endgame_empties=None, use_book=None, stats=None,
+                     playout_policy=None, pattern_eval=False, playout_depth=None, rave_k=None, max_tree_nodes=None):
+    if stats is None and stats_hooks:
+        stats = SearchStats()
+    start_time = time.perf_counter()
+
+    if use_book is None:
+        use_book = USE_BOOK and get_difficulty_param(difficulty).use_book
+    if use_book:
+        book = Opening_Book.get_book()
+        hit = book.lookup(board, tile) if book else None
+        if hit is not None:
+            _trees.pop(tile, None)
+            return _report(stats, "book", hit[0], start_time)
+
+    if endgame_empties is None:
+        endgame_empties = get_difficulty_param(difficulty).endgame_empties
+    if Endgame_Solver.empty_count(board) <= endgame_empties:
+        # 指定了思考时间时求解最多用其中的 ENDGAME_TIME_FRACTION，解不完则用剩余的时间做 MCTS
+        deadline = None
+        if think_time is not None:
+            deadline = start_time + min(think_time, MAX_THINK_TIME) * ENDGAME_TIME_FRACTION
+        solved = Endgame_Solver.solve(board, tile, deadline)
+        if solved is not None and solved[0] >= 0:
+            _trees.pop(tile, None)
+            return _report(stats, "endgame", bb.to_position(solved[0]), start_time)
+        if think_time is not None:
+            think_time = max(think_time - (time.perf_counter() - start_time), 0)
+
+    if workers is None:
+        workers = MCTS_WORKERS
+    if reuse_tree is None:
+        reuse_tree = TREE_REUSE
+    root = None
+    search_args = dict(
+        think_time=think_time, max_playouts=max_playouts, max_nodes=max_nodes, leaf_playouts=leaf_playouts, tile=tile,
+        tt_size=tt_size, playout_policy=playout_policy, pattern_eval=pattern_eval, playout_depth=playout_depth,
+        rave_k=rave_k, max_tree_nodes=max_tree_nodes,
+    )
+
+    if workers > 1:
+        pool = get_pool(workers)
+        stones = (board.stones[COMPUTER_NUM], board.stones[PLAYER_NUM])
+        futures = []
+        for _ in range(workers):
+            seed = random.randrange(0, 2**32)
+            futures.append(
+                pool.submit(_root_search, stones, difficulty, seed, search_args, stats is not None,
+                            stats is not None and stats.trace_memory)
+            )
+        # 合并各棵树根结点的模拟次数和奖励
+        merged = {}
+        for future in futures:
+            rows, worker_stats = future.result()
+            if stats is not None:
+                stats.merge(worker_stats)
+            for parent, t_playout, reward in rows:
+                t_sum, r_sum = merged.get(parent, (0, 0))
+                merged[parent] = (t_sum + t_playout, r_sum + reward)
+        root_stats = [(parent, t, r) for parent, (t, r) in merged.items()]
+    else:
+        # 结点池容量变化时会丢弃原有的树
+        node_pool = get_node_pool(tile, TREE_NODE_LIMIT if max_tree_nodes is None else max_tree_nodes)
+        if reuse_tree:
+            root = find_reused_root(board, tile)
+        if root is None:
+            root = new_root(tile, node_pool)
+        root_stats = mctsRootStats(board, difficulty, root, stats=stats, **search_args)
 
+    max_avg_reward = -1
+    mt_result = (0, 0)
+    for parent, t_playout, reward in root_stats:
+        if (t_playout > 0) and (reward / t_playout > max_avg_reward):
+            mt_result = parent
+            max_avg_reward = reward / t_playout
+
+    # 记录本次的搜索树，下次调用时从对手落子后的子树继续搜索
+    if reuse_tree and root is not None:
+        _trees[tile] = (board.copy(), root, bb.square(mt_result[0], mt_result[1]))
+    else:
+        _trees.pop(tile, None)
+
+    if stats is not None:
+        stats.children = root_stats
+    return _report(stats, "mcts", mt_result, start_time)
+
+
+# 填写统计信息并调用回调，返回走法
+def _report(stats, source, move, start_time):
+    if stats is not None:
+        stats.source = source
+        stats.move = move
+        stats.elapsed = time.perf_counter() - start_time
+        for hook in stats_hooks:
+            hook(stats)
+    return move
+
+
+# 每种颜色上一步的搜索树: {颜色: (搜索时的棋盘, 根结点, AI 选择的走法)}
+_trees = {}
+
+
+# 丢弃所有搜索树，只能在没有搜索进行时调用，否则抛出 RuntimeError
+def reset_tree():
+    for pool in _node_pools.values():
+        pool.clear()
+    _trees.clear()
+    _tables.clear()
+
+
+# 为 tile 一方新建搜索树的根结点，原有的树全部回收，置换表一并丢弃
+def new_root(tile, pool):
+    _trees.pop(tile, None)
+    _tables.pop(tile, None)
+    if pool is None:
+        return Node()
+    pool.clear()
+    return pool.new()
+
+
+# 在上一步的搜索树中找到 AI 走法 -> 对手走法 后与当前棋盘一致的孙结点，作为新的根结点
+def find_reused_root(board, tile=COMPUTER_NUM):
+    if tile not in _trees:
+        return None
+    prev_board, root, move = _trees[tile]
+    for child in root.children:
+        if child.move != move:
+            continue
+        after_board = prev_board.copy()
+        updateBoard(after_board, tile, *bb.to_position(move))
+        for reply in child.children:
+            reply_board = after_board.copy()
+            updateBoard(reply_board, bb.opponent(tile), *bb.to_position(reply.move))
+            if reply_board.stones == board.stones and reply.children:
+                # 回收原来的树中沿用的子树以外的结点
+                pool = _node_pools.get(tile)
+                if pool is not None:
+                    child.children.remove(reply)
+                    pool.release(root)
+                reply.parent = None
+                return reply
+    return None
+
+
+# 预读：在对手思考期间继续搜索上一步的搜索树
+# 从 AI 走法之后、轮到对手的局面出发，对对手所有可能的应手搜索，对手落子后 mctsNextPosition
+# 沿用实际应手的子树，对手的思考时间相当于计入了 AI 的搜索预算
+# board 为 AI 落子后的当前棋盘，stop 为 threading.Event，对手落子时置位
+# 预算默认为该难度的模拟次数，不超过 MAX_THINK_TIME，其余参数同 mctsRootStats
+# 返回本次预读的模拟次数，没有与 board 对应的搜索树或对手无子可下时返回 0
+def mctsPonder(board, difficulty, stop, think_time=None, max_playouts=None, tile=COMPUTER_NUM, **search_args):
+    if tile not in _trees:
+        return 0
+    prev_board, root, move = _trees[tile]
+    after_board = prev_board.copy()
+    after_board.play(tile, move)
+    if after_board.stones != board.stones or not possible_positions(board, bb.opponent(tile)):
+        return 0
+    for child in root.children:
+        if child.move == move:
+            break
+    else:
+        return 0
+    if think_time is None:
+        think_time = MAX_THINK_TIME
+    if max_playouts is None:
+        max_playouts = get_difficulty_param(difficulty).loops
+    # 模拟结果只向上传到 AI 走法的结点，该结点之外的统计不再使用
+    child.parent = None
+    before = child.nplayout
+    mctsRootStats(board, difficulty, child, think_time=think_time, max_playouts=max_playouts, tile=tile,
+                  to_move=bb.opponent(tile), stop=stop, **search_args)
+    return child.nplayout - before
+
+
+# 根并行搜索的进程池，跨多次调用复用
+_pool = None
+_pool_workers = 0
+
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+        _pool_workers = 0
+
+
+# 进程池中执行的单棵树搜索，每个进程使用独立的随机种子
+# collect_stats 为 True 时同时返回该进程的 SearchStats，trace_memory 同 SearchStats
+def _root_search(stones, difficulty, seed, search_args, collect_stats=False, trace_memory=False):
+    random.seed(seed)
+    board = bb.BitBoard()
+    board.stones[COMPUTER_NUM], board.stones[PLAYER_NUM] = stones
+    stats = SearchStats(trace_memory) if collect_stats else None
+    return mctsRootStats(board, difficulty, stats=stats, **search_args), stats
+
+
+# 搜索并返回根结点各子结点的 (位置, 模拟次数, 奖励)，root 为已有的根结点
+# to_move: 根结点轮到下棋的一方，默认为 AI 一方 tile，预读时为对手
+# stop: threading.Event，置位后在下一次模拟前结束搜索
+def mctsRootStats(board, difficulty, root=None, think_time=None, max_playouts=None, max_nodes=None, leaf_playouts=1,
+                  tile=COMPUTER_NUM, tt_size=None, stats=None, playout_policy=None, pattern_eval=False, playout_depth=None,
+                  rave_k=None, max_tree_nodes=None, to_move=None, stop=None):
+    # AI 执子的颜色，模拟结果都以这一方是否获胜计
+    me = tile
+    if to_move is None:
+        to_move = me
+
+    # amaf_n 不为 0 时按 RAVE 把 AMAF 胜率混入平均胜率，权重随结点模拟次数增加而衰减
+    def ucb1(nplayout, reward, t, cval, amaf_n=0, amaf_w=0):
         if nplayout == 0:
             nplayout = 0.00000000001
 
         if t == 0:
             t = 1
 
-        return (reward / nplayout) + cval * math.sqrt(2 * math.log(t) / nplayout)
-
-    # 不断递归随机下棋，返回最终谁赢了，机器赢了True
-    def find_playout(tep_board, tile, depth=0):
-        def eval_board(tep_board):
-            player_tile = countTile(tep_board, PLAYER_NUM)
-            computer_tile = countTile(tep_board, COMPUTER_NUM)
-            if computer_tile > player_tile:
-                return True
-            return False
-        if depth > 32:
-            return eval_board(tep_board)
-        turn_positions = possible_positions(tep_board, tile)
-
-        # 查看是否可以在这个位置下棋
-        if len(turn_positions) == 0:
-            if tile == COMPUTER_NUM:
-                neg_turn = PLAYER_NUM
-            else:
-                neg_turn = COMPUTER_NUM
-
-            neg_turn_positions = possible_positions(tep_board, neg_turn)
-
-            if len(neg_turn_positions) == 0:
-                return eval_board(tep_board)
-            else:
-                tile = neg_turn
-                turn_positions = neg_turn_positions
-
-        # 随机放置一个棋子
-        temp = turn_positions[random.randrange(0, len(turn_positions))]
-        updateBoard(tep_board, tile, temp[0], temp[1])
-
-        # 转换轮次
-        if tile == COMPUTER_NUM:
-            tile = PLAYER_NUM
-        else:
-            tile = COMPUTER_NUM
-
-        return find_playout(tep_board, tile, depth=depth + 1)
-
-    def expand(tep_board, tile):
-        positions = possible_positions(tep_board, tile)
-        result = []
-        for temp in positions:
-            result.append((temp, 0, 0, []))
-        return result
-
-    # 通过ucb算法和最大最小搜索，返回下一步棋
-    def find_path(root, total_playout, difficulty_param):
-        current_path = []
-        child = root
-        parent_playout = total_playout
-        isMCTSTurn = True
-
-        while True:
-            if len(child) == 0:
-                break
-            maxidxlist = [0]
-            cidx = 0
+        mean = reward / nplayout
+        if amaf_n:
+            beta = math.sqrt(rave_k / (3 * nplayout + rave_k))
+            mean = (1 - beta) * mean + beta * amaf_w / amaf_n
+        return mean + cval * math.sqrt(2 * math.log(t) / nplayout)
+
+    # 对同一叶结点进行 n 局模拟，返回机器赢的局数
+    def find_playouts(tep_board, tile, n):
+        if rng is None:
+            return sum(playout(tep_board, tile) for _ in range(n))
+        margin = Batch_Playout.batch_playout(
+            tep_board.stones[tile], tep_board.stones[bb.opponent(tile)], n, rng, max_depth=playout_depth
+        )
+        if tile == me:
+            return int((margin > 0).sum())
+        return int((margin < 0).sum())
+
+    # 通过ucb算法和最大最小搜索，沿途在棋盘上落子并把 (颜色, 位置, 翻转) 记入 history，
+    # 返回选中的叶结点和轮到下棋的一方
+    def find_path(root, tep_board, history, difficulty_param):
+        node = root
+        tile = to_move
+        isMCTSTurn = tile == me
+
+        while node.children:
+            maxlist = []
             if isMCTSTurn:
                 maxval = -1
             else:
                 maxval = 2
 
-            for n_tuple in child:
-                parent, t_playout, reward, t_childrens = n_tuple
+            for child in node.children:
+                # 同一局面经由其他走子顺序积累的统计更多时，使用置换表中的统计
+                nplayout, reward = child.nplayout, child.reward
+                if tt is not None and child.key:
+                    entry = tt.get(child.key)
+                    if entry is not None and entry.nplayout > nplayout:
+                        nplayout, reward = entry.nplayout, entry.reward
 
                 #实现最大最小搜索，电脑选择最大值，玩家选择最小值
                 if isMCTSTurn:
-                    cval = ucb1(n_tuple, parent_playout, difficulty_param[1])
+                    cval = ucb1(nplayout, reward, node.nplayout, difficulty_param.cval_computer, child.amaf_n, child.amaf_w)
 
                     if cval >= maxval:
                         if cval == maxval:
-                            maxidxlist.append(cidx)
+                            maxlist.append(child)
                         else:
-                            maxidxlist = [cidx]
+                            maxlist = [child]
                             maxval = cval
                 else:
-                    cval = ucb1(n_tuple, parent_playout, difficulty_param[2])
+                    cval = ucb1(nplayout, reward, node.nplayout, difficulty_param.cval_player, child.amaf_n, child.amaf_w)
 
                     if cval <= maxval:
                         if cval == maxval:
-                            maxidxlist.append(cidx)
+                            maxlist.append(child)
                         else:
-                            maxidxlist = [cidx]
+                            maxlist = [child]
                             maxval = cval
 
-                cidx += 1
-
             # 随机进行下棋，扩展
-            maxidx = maxidxlist[random.randrange(0, len(maxidxlist))]
-            parent, t_playout, reward, t_childrens = child[maxidx]
-            current_path.append(parent)
-            parent_playout = t_playout
-            child = t_childrens
+            node = maxlist[random.randrange(0, len(maxlist))] if maxlist else node.children[0]
+            history.append((tile, node.move, tep_board.play(tile, node.move)))
+            tile = bb.opponent(tile)
             isMCTSTurn = not (isMCTSTurn)
-
-        return current_path
-
-    root = expand(board, COMPUTER_NUM)
+            if tt is not None and not node.key:
+                node.key = Transposition.canonical_hash(tep_board, tile)
+
+        return node, tile
+
+    # root 为 None 时从结点池新建根结点，原有的同色搜索树作废
+    if max_tree_nodes is None:
+        max_tree_nodes = TREE_NODE_LIMIT
+    pool = get_node_pool(me, max_tree_nodes)
+    if root is None:
+        root = new_root(me, pool)
+    if not root.children:
+        # 预读时需要对手的每种应手都能与实际落子后的棋盘对应，不合并对称走法
+        root.children = expand(board, to_move, root, unique=to_move == me, pool=pool)
+        if root.children is None:
+            raise ValueError("max_tree_nodes 过小，无法展开根结点")
+    # 裁剪后空闲结点仍不够时不再扩展
+    pool_exhausted = False
     difficulty_param = get_difficulty_param(difficulty)
-    current_board = getInitialBoard()
-    current_board2 = getInitialBoard()
-
-    for loop in range(0, difficulty_param[0]):
-
-        # current_path是一个放置棋子的位置列表，根据此列表进行后续操作
-        current_path = find_path(root, loop, difficulty_param)
-        tile = COMPUTER_NUM
-        for temp in current_path:
-            updateBoard(current_board, tile, temp[0], temp[1])
-            if tile == COMPUTER_NUM:
-                tile = PLAYER_NUM
-            else:
-                tile = COMPUTER_NUM
-
-        #复制棋盘，因为会在find_playout函数修改了棋盘
-        isWon = find_playout(current_board2, tile)
-
-        #自顶向下传递参数
-        child = root
-        for temp in current_path:
-            idx = 0
-            for n_tuple in child:
-                parent, t_playout, reward, t_childrens = n_tuple
-                if temp[0] == parent[0] and temp[1] == parent[1]:
+    # 沿用的树已有的结点也计入 max_nodes，只在需要时遍历计数
+    node_count = count_nodes(root) if max_nodes is not None else 0
+
+    deadline = None
+    if think_time is not None:
+        deadline = time.perf_counter() + min(think_time, MAX_THINK_TIME)
+    elif max_playouts is None and max_nodes is None:
+        max_playouts = difficulty_param.loops
+
+    # 整个搜索共用一个棋盘，每次模拟后撤销落子
+    search_board = board.copy()
+    history = []
+
+    if tt_size is None:
+        tt_size = TT_SIZE
+    tt = get_table(me, tt_size)
+
+    # 叶结点多局模拟时优先使用 NumPy 批量模拟
+    # 模拟策略，均匀随机时为 None
+    policy = Playout_Policy.get_policy(playout_policy or difficulty_param.playout_policy)
+    if policy.choose is None:
+        policy = None
+
+    evaluate = None
+    if pattern_eval:
+        evaluator = Pattern_Eval.get_evaluator()
+        if evaluator is None:
+            raise ValueError("模式评估权重文件不存在: {}".format(Pattern_Eval.DEFAULT_PATH))
+        evaluate = evaluator.win_probability
+    if playout_depth is None:
+        playout_depth = PLAYOUT_DEPTH
+
+    if rave_k is None:
+        rave_k = difficulty_param.rave_k
+    # RAVE 模式下记录模拟中双方落子的位置
+    played = [0, 0, 0] if rave_k else None
+
+    def playout(tep_board, tile):
+        return find_playout(tep_board, tile, me, policy=policy, max_depth=playout_depth, evaluate=evaluate, played=played)
+
+    # 批量模拟只支持均匀随机、按棋子数判断胜负，不记录落子位置
+    rng = None
+    if leaf_playouts > 1 and policy is None and evaluate is None and not rave_k and Batch_Playout.available():
+        rng = Batch_Playout.np.random.default_rng(random.getrandbits(64))
+
+    # 统计各阶段耗时，只在需要时计时
+    timed = stats is not None
+    phase_time = dict.fromkeys(SearchStats.PHASES, 0.0)
+    max_depth = 0
+    clock = time.perf_counter
+    loop = 0
+    playouts = 0
+    # 需要时只在搜索循环期间启动 tracemalloc，调用方已启动时沿用
+    trace = stats is not None and stats.trace_memory and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+    if pool is not None:
+        pool.searching = True
+    try:
+        while True:
+            # 每次模拟前检查预算，至少完成一次模拟
+            if loop > 0:
+                if max_playouts is not None and playouts >= max_playouts:
+                    break
+                if max_nodes is not None and node_count >= max_nodes:
+                    break
+                if deadline is not None and time.perf_counter() >= deadline:
+                    break
+                if stop is not None and stop.is_set():
                     break
-                idx += 1
-
-            if temp[0] == parent[0] and temp[1] == parent[1]:
-                t_playout += 1
-                if isWon:
-                    reward += 1
-                if t_playout >= 5 and len(t_childrens) == 0:
-                    t_childrens = expand(current_board, tile)
-
-                child[idx] = (parent, t_playout, reward, t_childrens)
-
-            child = t_childrens
-
-    max_avg_reward = -1
-    mt_result = (0, 0)
-    for n_tuple in root:
-        parent, t_playout, reward, t_childrens = n_tuple
-
-        if (t_playout > 0) and (reward / t_playout > max_avg_reward):
-            mt_result = parent
-            max_avg_reward = reward / t_playout
 
-    return mt_result
+            if timed:
+                t0 = clock()
+            leaf, tile = find_path(root, search_board, history, difficulty_param)
+            if timed:
+                t1 = clock()
+                phase_time["selection"] += t1 - t0
+                if len(history) > max_depth:
+                    max_depth = len(history)
+
+            if leaf_playouts > 1:
+                wins = find_playouts(search_board, tile, leaf_playouts)
+            else:
+                wins = playout(search_board, tile)
+            if timed:
+                t2 = clock()
+                phase_time["simulation"] += t2 - t1
+
+            #自底向上沿父结点传递参数
+            node = leaf
+            depth = len(history)
+            while node is not None:
+                node.nplayout += leaf_playouts
+                node.reward += wins
+                if tt is not None and node.key:
+                    tt.update(node.key, leaf_playouts, wins)
+                if played is not None:
+                    # 该结点之后轮到下棋的一方在模拟或树中落过子的位置，对应子结点更新 AMAF 统计
+                    mover = to_move if depth % 2 == 0 else bb.opponent(to_move)
+                    mask = played[mover]
+                    for child in node.children:
+                        if mask >> child.move & 1:
+                            child.amaf_n += leaf_playouts
+                            child.amaf_w += wins
+                    if depth:
+                        depth -= 1
+                        played[history[depth][0]] |= 1 << history[depth][1]
+                node = node.parent
+            if played is not None:
+                played[bb.WHITE_NUM] = played[bb.BLACK_NUM] = 0
+            if timed:
+                t3 = clock()
+                phase_time["backprop"] += t3 - t2
+
+            if leaf is not root and leaf.nplayout >= 5 and not pool_exhausted:
+                children = expand(search_board, tile, leaf, pool=pool)
+                if children is None:
+                    # 结点池已满，回收访问次数最少的子树后重试
+                    target = max(int(pool.capacity * PRUNE_FRACTION), BOARD_SIZE * BOARD_SIZE)
+                    node_count -= pool.prune(root, leaf, target)
+                    if pool.available() < target:
+                        pool_exhausted = True
+                    children = expand(search_board, tile, leaf, pool=pool)
+                if children is not None:
+                    leaf.children = children
+                    node_count += len(children)
+
+            while history:
+                search_board.undo(*history.pop())
+            if timed:
+                phase_time["expansion"] += clock() - t3
+
+            loop += 1
+            playouts += leaf_playouts
+    finally:
+        if pool is not None:
+            pool.searching = False
+        if trace:
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    if timed:
+        stats.iterations += loop
+        stats.playouts += playouts
+        stats.node_count += count_nodes(root)
+        stats.max_depth = max(stats.max_depth, max_depth)
+        for phase, seconds in phase_time.items():
+            stats.phase_time[phase] += seconds
+        if not trace and tracemalloc.is_tracing():
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    return [(bb.to_position(child.move), child.nplayout, child.reward) for child in root.children]
@@ -0,0 +1,165 @@
+# 开局库：离线对开局若干步内的所有局面做深度搜索，结果写入紧凑的二进制文件
+# 局面按 8 种对称变换规范化后取哈希，运行时通过 mmap 二分查找，启动时无需解析
+# 用法: python Opening_Book.py -o opening_book.bin --ply 6 --playouts 20000 --workers 8
+#
+# 文件格式（小端）:
+#   文件头: 魔数 b"RVBK", 版本 u16, 最大步数 u16, 记录数 u32
+#   记录:   局面哈希 u64, 得分 i16（最佳走法的胜率 * 1000）, 规范形式下的最佳走法 u8, 填充 1 字节
+#   记录按局面哈希升序排列
+import argparse
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+import Bitboard as bb
+import Symmetry
+import Transposition
+
+MAGIC = b"RVBK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+RECORD = struct.Struct("<QhBx")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+
+
+# 局面规范化后的哈希，以及从原局面到规范形式的变换编号
+def book_key(board, tile):
+    own, opp, k = Symmetry.canonical_board(board, tile)
+    return Transposition.position_hash(own, opp), k
+
+
+class OpeningBook:
+    def __init__(self, path=DEFAULT_PATH):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_ply, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("不是有效的开局库文件: {}".format(path))
+
+    # 按局面哈希二分查找，返回 (规范形式下的走法, 得分)，找不到时返回 None
+    def probe(self, key):
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            mid_key, score, move = RECORD.unpack_from(self._mm, HEADER.size + mid * RECORD.size)
+            if mid_key < key:
+                low = mid + 1
+            elif mid_key > key:
+                high = mid
+            else:
+                return move, score
+        return None
+
+    # 查找 tile 一方在 board 上的开局库走法，返回 ((row, col), 得分) 或 None
+    def lookup(self, board, tile):
+        key, k = book_key(board, tile)
+        hit = self.probe(key)
+        if hit is None:
+            return None
+        move, score = hit
+        sq = Symmetry.INVERSE_MAP[k][move]
+        # 哈希冲突时走法可能不合法
+        if not bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)]) >> sq & 1:
+            return None
+        return bb.to_position(sq), score
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+# 默认开局库，第一次使用时打开，文件不存在时为 False
+_default_book = None
+
+
+def get_book():
+    global _default_book
+    if _default_book is None:
+        try:
+            _default_book = OpeningBook(DEFAULT_PATH)
+        except (OSError, ValueError):
+            _default_book = False
+    return _default_book or None
+
+
+# 从初始局面展开 max_ply 步内的所有局面，对称局面只保留一个
+# 返回 [(局面哈希, 变换编号, 白棋, 黑棋, 轮到下棋的一方)]
+def enumerate_positions(max_ply):
+    board = bb.initial_board()
+    frontier = [(board, bb.BLACK_NUM)]
+    seen = {}
+    for ply in range(max_ply + 1):
+        next_frontier = []
+        for board, tile in frontier:
+            moves = bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)])
+            if not moves:
+                tile = bb.opponent(tile)
+                moves = bb.get_moves(board.stones[tile], board.stones[bb.opponent(tile)])
+                if not moves:
+                    continue
+            key, k = book_key(board, tile)
+            if key in seen:
+                continue
+            seen[key] = (key, k, board.stones[bb.WHITE_NUM], board.stones[bb.BLACK_NUM], tile)
+            if ply == max_ply:
+                continue
+            for sq in bb.iter_bits(moves):
+                child = board.copy()
+                child.play(tile, sq)
+                next_frontier.append((child, bb.opponent(tile)))
+        frontier = next_frontier
+    return list(seen.values())
+
+
+# 进程池中执行的单个局面搜索，返回 (局面哈希, 得分, 规范形式下的最佳走法)
+def _search_position(args):
+    import MCTS_Algorithm as rvs
+
+    key, k, white, black, tile, difficulty, playouts = args
+    board = bb.BitBoard(white, black)
+    stats = rvs.mctsRootStats(board, difficulty, max_playouts=playouts, tile=tile)
+    best_pos, best_rate = None, -1
+    for pos, t_playout, reward in stats:
+        if t_playout > 0 and reward / t_playout > best_rate:
+            best_pos, best_rate = pos, reward / t_playout
+    move = Symmetry.SQUARE_MAP[k][bb.square(*best_pos)]
+    return key, round(best_rate * 1000), move
+
+
+def write_book(path, max_ply, records):
+    records = sorted(records)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, max_ply, len(records)))
+        for key, score, move in records:
+            f.write(RECORD.pack(key, score, move))
+
+
+def build_book(path, max_ply=6, difficulty=2, playouts=20000, workers=1):
+    positions = enumerate_positions(max_ply)
+    tasks = [position + (difficulty, playouts) for position in positions]
+    print("共 {} 个局面".format(len(tasks)))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        records = list(pool.map(_search_position, tasks, chunksize=4))
+    write_book(path, max_ply, records)
+    return len(records)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="生成 Reversi AI 开局库")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="开局库文件")
+    parser.add_argument("--ply", type=int, default=6, help="收录开局多少步内的局面")
+    parser.add_argument("--difficulty", type=int, default=2, choices=(0, 1, 2), help="搜索使用的难度")
+    parser.add_argument("--playouts", type=int, default=20000, help="每个局面的模拟次数")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="进程数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    count = build_book(args.output, args.ply, args.difficulty, args.playouts, args.workers)
+    print("已写入 {} 条记录到 {}".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
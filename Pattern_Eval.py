@@ -0,0 +1,187 @@
+# 基于模式（n-tuple）的局面评估：边、角、对角线等固定格子组合的每种状态对应一个权重
+# 格子组合的状态按三进制编码（0:空 1:己方 2:对方）作为权重表下标，评估值为各模式权重之和，
+# 表示轮到下棋一方的预计终局棋子差。棋盘的 8 种对称变换共用同一套权重，对局按棋子数分阶段
+# 权重离线从自对弈棋谱中训练，先生成棋谱再训练:
+#   python Tournament.py -n 2000 -w 8 -a mcts:HARD -b mcts:HARD --record selfplay.rvgr
+#   python Pattern_Eval.py selfplay.rvgr -o pattern_weights.bin --epochs 4
+#
+# 权重文件格式（小端）:
+#   文件头: 魔数 b"RVPT", 版本 u16, 阶段数 u16
+#   之后按阶段依次存放: 偏置 f32, 各模式的权重表 f32 * 3^格子数
+import argparse
+import math
+import os
+import struct
+from array import array
+import Bitboard as bb
+import Game_Record
+from Symmetry import SYMMETRY_COUNT, transform
+
+MAGIC = b"RVPT"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pattern_weights.bin")
+# 按棋子数把对局分成的阶段数
+STAGES = 4
+# 评估值（棋子差）换算为胜率时的缩放
+MARGIN_SCALE = 8.0
+
+# 模式名称及格子数，格子的取法见 pattern_codes
+PATTERNS = (("edge_x", 10), ("corner", 9), ("row1", 8), ("row2", 8), ("diagonal", 8))
+DIAGONAL = 0x8040201008040201
+
+# TERNARY[mask]: 把二进制位当作三进制数位 1 读出的值
+TERNARY = [0] * 1024
+for _mask in range(1, 1024):
+    _low = _mask & -_mask
+    TERNARY[_mask] = TERNARY[_mask ^ _low] + 3 ** (_low.bit_length() - 1)
+
+
+def stage_of(own, opp):
+    return (bb.popcount(own | opp) - 4) * STAGES // 61
+
+
+# 返回局面在 8 种对称变换下所有模式的 (模式下标, 三进制编码)
+# 每种变换下取第 0 行加两个 X 格、左上角 3x3、第 1 行、第 2 行、主对角线，
+# 8 种变换合起来覆盖了棋盘上所有的边、角、次边和两条对角线
+def pattern_codes(own, opp):
+    codes = []
+    for k in range(SYMMETRY_COUNT):
+        o = transform(own, k)
+        p = transform(opp, k)
+        codes.append((0, TERNARY[(o & 0xFF) | ((o >> 1) & 0x100) | ((o >> 5) & 0x200)]
+                      + 2 * TERNARY[(p & 0xFF) | ((p >> 1) & 0x100) | ((p >> 5) & 0x200)]))
+        codes.append((1, TERNARY[(o & 7) | ((o >> 5) & 0x38) | ((o >> 10) & 0x1C0)]
+                      + 2 * TERNARY[(p & 7) | ((p >> 5) & 0x38) | ((p >> 10) & 0x1C0)]))
+        codes.append((2, TERNARY[(o >> 8) & 0xFF] + 2 * TERNARY[(p >> 8) & 0xFF]))
+        codes.append((3, TERNARY[(o >> 16) & 0xFF] + 2 * TERNARY[(p >> 16) & 0xFF]))
+        codes.append((4, TERNARY[((o & DIAGONAL) * 0x0101010101010101 >> 56) & 0xFF]
+                      + 2 * TERNARY[((p & DIAGONAL) * 0x0101010101010101 >> 56) & 0xFF]))
+    return codes
+
+
+class PatternEvaluator:
+    def __init__(self):
+        # tables[阶段][模式下标] 为该模式的权重表
+        self.bias = array("f", [0.0] * STAGES)
+        self.tables = [[array("f", [0.0]) * 3 ** size for _, size in PATTERNS] for _ in range(STAGES)]
+
+    # 轮到下棋的 own 一方的预计终局棋子差
+    def evaluate(self, own, opp):
+        stage = stage_of(own, opp)
+        tables = self.tables[stage]
+        value = self.bias[stage]
+        for index, code in pattern_codes(own, opp):
+            value += tables[index][code]
+        return value
+
+    # own 一方的胜率估计
+    def win_probability(self, own, opp):
+        return 1 / (1 + math.exp(-self.evaluate(own, opp) / MARGIN_SCALE))
+
+    # 以平方误差做一步随机梯度下降，返回更新前的误差
+    def update(self, own, opp, target, rate):
+        stage = stage_of(own, opp)
+        tables = self.tables[stage]
+        codes = pattern_codes(own, opp)
+        value = self.bias[stage]
+        for index, code in codes:
+            value += tables[index][code]
+        error = target - value
+        step = rate * error
+        self.bias[stage] += step
+        for index, code in codes:
+            tables[index][code] += step
+        return error
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, STAGES))
+            for stage in range(STAGES):
+                self.bias[stage : stage + 1].tofile(f)
+                for table in self.tables[stage]:
+                    table.tofile(f)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        evaluator = cls()
+        with open(path, "rb") as f:
+            magic, version, stages = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or stages != STAGES:
+                raise ValueError("不是有效的模式权重文件: {}".format(path))
+            bias = array("f")
+            for stage in range(STAGES):
+                bias.fromfile(f, 1)
+                for table in evaluator.tables[stage]:
+                    data = array("f")
+                    data.fromfile(f, len(table))
+                    table[:] = data
+            evaluator.bias = bias
+        return evaluator
+
+
+# 默认权重，第一次使用时载入，文件不存在时为 False
+_default_evaluator = None
+
+
+def get_evaluator():
+    global _default_evaluator
+    if _default_evaluator is None:
+        try:
+            _default_evaluator = PatternEvaluator.load(DEFAULT_PATH)
+        except (OSError, EOFError, ValueError):
+            _default_evaluator = False
+    return _default_evaluator or None
+
+
+# 从棋谱中依次取出训练样本 (己方, 对方, 己方的终局棋子差)
+def training_positions(paths):
+    for path in paths:
+        for record in Game_Record.read_records(path):
+            margin = record.white_num - record.black_num
+            for board, tile, sq in Game_Record.replay(record):
+                own = board.stones[tile]
+                opp = board.stones[bb.opponent(tile)]
+                yield own, opp, margin if tile == bb.WHITE_NUM else -margin
+
+
+# 按棋谱训练权重，每轮重新流式读取棋谱，返回每轮的均方根误差
+# 学习率按一个局面用到的模式个数归一化
+def train(paths, epochs=4, rate=0.05, evaluator=None, verbose=False):
+    if evaluator is None:
+        evaluator = PatternEvaluator()
+    step = rate / (len(PATTERNS) * SYMMETRY_COUNT + 1)
+    history = []
+    for epoch in range(epochs):
+        total = 0.0
+        count = 0
+        for own, opp, target in training_positions(paths):
+            error = evaluator.update(own, opp, target, step)
+            total += error * error
+            count += 1
+        history.append(math.sqrt(total / count) if count else 0.0)
+        if verbose:
+            print("第 {} 轮: {} 个局面, 均方根误差 {:.3f}".format(epoch + 1, count, history[-1]))
+    return evaluator, history
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="从棋谱训练 Reversi AI 模式评估权重")
+    parser.add_argument("records", nargs="+", help="棋谱文件，格式见 Game_Record.py")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="权重文件")
+    parser.add_argument("--epochs", type=int, default=4, help="训练轮数")
+    parser.add_argument("--rate", type=float, default=0.05, help="学习率")
+    parser.add_argument("--resume", action="store_true", help="在已有的权重文件基础上继续训练")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    evaluator = PatternEvaluator.load(args.output) if args.resume else None
+    evaluator, _ = train(args.records, args.epochs, args.rate, evaluator, verbose=True)
+    evaluator.save(args.output)
+    print("权重已写入 {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# 模拟中的走法选择策略
+# 均匀随机的模拟携带的信息少，带启发式的策略让模拟更接近真实对局，同样的模拟次数下棋力更强
+# 每个策略有代价预算 budget: 一局模拟只有前 budget 步使用策略，之后退回均匀随机，
+# 离搜索树越近的几步对结果影响越大，预算用在这里，策略的开销不至于抵消模拟质量的提升
+import random
+from collections import namedtuple
+import Bitboard as bb
+
+CORNERS = 0x8100000000000081
+
+
+def _mask(*squares):
+    result = 0
+    for i, j in squares:
+        result |= 1 << bb.square(i, j)
+    return result
+
+
+# 每个角及其旁边的 X 格（斜邻）和 C 格（边上相邻），角为空时在这两种格子落子容易把角送给对方
+CORNER_DANGER = (
+    (_mask((0, 0)), _mask((1, 1), (0, 1), (1, 0))),
+    (_mask((0, 7)), _mask((1, 6), (0, 6), (1, 7))),
+    (_mask((7, 0)), _mask((6, 1), (7, 1), (6, 0))),
+    (_mask((7, 7)), _mask((6, 6), (7, 6), (6, 7))),
+)
+# 以 (1 - EPSILON) 的概率选择启发式最好的走法
+EPSILON = 0.1
+
+# name: 策略名, choose(own, opp, moves): 返回落子位置, budget: 每局模拟中使用策略的步数
+Policy = namedtuple("Policy", ["name", "choose", "budget"])
+
+
+# 在 moves 中均匀随机选一个位置
+def random_square(moves):
+    for _ in range(random.randrange(0, bb.popcount(moves))):
+        moves &= moves - 1
+    return (moves & -moves).bit_length() - 1
+
+
+# 角为空时其旁边的危险格子
+def danger_squares(own, opp):
+    occupied = own | opp
+    danger = 0
+    for corner, around in CORNER_DANGER:
+        if not occupied & corner:
+            danger |= around
+    return danger
+
+
+# 格子分级: 角优先，其次是非危险格子，最后才是危险格子，同级中均匀随机
+def choose_square(own, opp, moves):
+    best = moves & CORNERS
+    if not best:
+        best = moves & ~danger_squares(own, opp)
+        if not best:
+            best = moves
+    return random_square(best)
+
+
+# ε-贪心: 有角先占角，否则选落子后对方行动力最小的走法，危险格子排在最后
+def choose_mobility(own, opp, moves):
+    if moves & CORNERS:
+        return random_square(moves & CORNERS)
+    if random.random() < EPSILON:
+        return random_square(moves)
+    safe = moves & ~danger_squares(own, opp)
+    if safe:
+        moves = safe
+    best_sq, best_mobility = -1, 65
+    for sq in bb.iter_bits(moves):
+        bit = 1 << sq
+        flips = bb.get_flips(own, opp, sq)
+        mobility = bb.popcount(bb.get_moves(opp ^ flips, own | flips | bit))
+        if mobility < best_mobility:
+            best_sq, best_mobility = sq, mobility
+    return best_sq
+
+
+POLICIES = {
+    "uniform": Policy("uniform", None, 0),
+    "square": Policy("square", choose_square, 64),
+    "mobility": Policy("mobility", choose_mobility, 6),
+}
+
+
+# 按名字取得策略，policy 本身是 Policy 时原样返回
+def get_policy(policy):
+    if isinstance(policy, Policy):
+        return policy
+    try:
+        return POLICIES[policy]
+    except KeyError:
+        raise ValueError("未知的模拟策略: {}".format(policy))
@@ -0,0 +1,309 @@
+# 基于 asyncio 的对局服务器，一个进程同时托管多局人机对局
+# 协议: TCP 上逐行收发 JSON，每行一个请求，服务器按行返回一个响应
+#   {"cmd": "new", "color": "black", "difficulty": 2}         新建对局，color 为玩家执的颜色
+#   {"cmd": "move", "game": 1, "row": 2, "col": 3, "think_time": 1.0}
+#                                                              玩家落子，返回之后 AI 的落子
+#   {"cmd": "resume", "game": 1, "think_time": 1.0}            AI 的搜索返回 busy 后，继续 AI 的落子
+#   {"cmd": "state", "game": 1}                                查询对局
+#   {"cmd": "close", "game": 1}                                结束对局
+# 对局属于新建它的连接，连接断开时该连接新建的对局一并结束
+# 响应: {"ok": true, ...} 或 {"ok": false, "error": "..."}，busy 错误同时返回对局编号
+# AI 的搜索在共享的进程池中执行，排队的搜索过多时返回 busy，由客户端稍后重试
+# 用法: python Server.py --port 8765 --workers 4
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import MCTS_Algorithm as rvs
+import Bitboard as bb
+
+WHITE_NUM = bb.WHITE_NUM
+BLACK_NUM = bb.BLACK_NUM
+COLOR_KEY = {WHITE_NUM: "white", BLACK_NUM: "black"}
+TILE_OF = {name: tile for tile, name in COLOR_KEY.items()}
+
+DEFAULT_THINK_TIME = 1.0
+# 单个请求允许的最长思考时间
+MAX_THINK_TIME = 10.0
+# 等待进程池空位的最长时间，超时返回 busy
+QUEUE_TIMEOUT = 5.0
+MAX_SESSIONS = 1000
+# 单行请求的最大长度
+MAX_LINE = 4096
+
+
+# game 为出错的对局编号，随错误一起返回给客户端
+class ServerError(Exception):
+    def __init__(self, message, game=None):
+        super().__init__(message)
+        self.game = game
+
+
+# 进程池中执行的搜索，返回 (row, col)
+def _search(white, black, tile, difficulty, think_time):
+    board = bb.BitBoard(white, black)
+    return rvs.mctsNextPosition(board, difficulty, think_time=think_time, tile=tile, workers=1, reuse_tree=False)
+
+
+# 一局对局的状态，与 main.py 中的 ReversiData 对应
+class GameSession:
+    def __init__(self, game_id, player, difficulty, owner=None):
+        self.game_id = game_id
+        # 新建对局的连接的处理任务，连接断开时结束对局
+        self.owner = owner
+        self.board = bb.initial_board()
+        self.player = player
+        self.computer = bb.opponent(player)
+        self.difficulty = difficulty
+        # 轮到下棋的一方，对局结束时为 0
+        self.turn = BLACK_NUM
+        # 同一局的请求依次处理
+        self.lock = asyncio.Lock()
+
+    def moves(self, tile):
+        return bb.get_moves(self.board.stones[tile], self.board.stones[bb.opponent(tile)])
+
+    # 落子后交给对方，对方无子可下时仍由本方下，双方都无子可下时结束
+    def play(self, tile, sq):
+        self.board.play(tile, sq)
+        if self.moves(bb.opponent(tile)):
+            self.turn = bb.opponent(tile)
+        elif self.moves(tile):
+            self.turn = tile
+        else:
+            self.turn = 0
+
+    def as_dict(self):
+        white = bb.popcount(self.board.stones[WHITE_NUM])
+        black = bb.popcount(self.board.stones[BLACK_NUM])
+        result = {
+            "game": self.game_id,
+            "board": [[self.board.get(i, j) for j in range(bb.BOARD_SIZE)] for i in range(bb.BOARD_SIZE)],
+            "player": COLOR_KEY[self.player],
+            "turn": COLOR_KEY.get(self.turn),
+            "white": white,
+            "black": black,
+            "finished": self.turn == 0,
+        }
+        if self.turn == 0:
+            result["winner"] = "white" if white > black else "black" if black > white else "draw"
+        return result
+
+
+class GameServer:
+    def __init__(self, workers=None, think_time=DEFAULT_THINK_TIME, max_think_time=MAX_THINK_TIME,
+                 max_pending=None, queue_timeout=QUEUE_TIMEOUT, max_sessions=MAX_SESSIONS):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.think_time = think_time
+        self.max_think_time = max_think_time
+        self.queue_timeout = queue_timeout
+        self.max_sessions = max_sessions
+        # 同时提交到进程池的搜索数，默认每个进程最多排队一个
+        self.slots = asyncio.Semaphore(max_pending or self.workers * 2)
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._server = None
+        # 当前连接: 处理任务 -> writer
+        self._clients = {}
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self._server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # 关闭现有连接，等待处理中的请求结束
+        for writer in self._clients.values():
+            writer.close()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        self.pool.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    await self._send(writer, {"ok": False, "error": "请求过长"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                await self._send(writer, await self.dispatch(line))
+        except ConnectionError:
+            pass
+        finally:
+            del self._clients[task]
+            # 客户端没有 close 就断开时，丢弃它的对局，避免占满 max_sessions
+            for game_id in [game_id for game_id, session in self.sessions.items() if session.owner is task]:
+                del self.sessions[game_id]
+            writer.close()
+
+    async def _send(self, writer, response):
+        writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+        await writer.drain()
+
+    async def dispatch(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ServerError("请求必须是 JSON 对象")
+            handler = getattr(self, "cmd_" + str(request.get("cmd")), None)
+            if handler is None:
+                raise ServerError("未知的命令: {}".format(request.get("cmd")))
+            response = await handler(request)
+        except json.JSONDecodeError:
+            return {"ok": False, "error": "无效的 JSON"}
+        except ServerError as e:
+            response = {"ok": False, "error": str(e)}
+            if e.game is not None:
+                response["game"] = e.game
+            return response
+        except Exception as e:
+            # 其他异常（如搜索进程崩溃）也要回复，不能断开连接
+            traceback.print_exc()
+            return {"ok": False, "error": "服务器内部错误: {}: {}".format(type(e).__name__, e)}
+        response["ok"] = True
+        return response
+
+    def session(self, request):
+        game = request.get("game")
+        # bool 是 int 的子类，true 不能当作对局 1
+        if not isinstance(game, int) or isinstance(game, bool):
+            raise ServerError("无效的对局编号: {}".format(game))
+        session = self.sessions.get(game)
+        if session is None:
+            raise ServerError("对局不存在: {}".format(request.get("game")))
+        return session
+
+    # json.loads 接受 NaN 和 Infinity，NaN 的截止时间永远不会到，必须排除；bool 也不能当作数字
+    def budget(self, request):
+        think_time = request.get("think_time", self.think_time)
+        if (not isinstance(think_time, (int, float)) or isinstance(think_time, bool)
+                or not math.isfinite(think_time) or think_time <= 0):
+            raise ServerError("无效的思考时间: {}".format(think_time))
+        return min(think_time, self.max_think_time)
+
+    # 在进程池中搜索 session 中 AI 的下一步，进程池排满时等待，超时返回 busy
+    async def search(self, session, think_time):
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ServerError("busy", session.game_id)
+        try:
+            loop = asyncio.get_running_loop()
+            stones = session.board.stones
+            return await loop.run_in_executor(
+                self.pool, _search, stones[WHITE_NUM], stones[BLACK_NUM], session.computer, session.difficulty, think_time
+            )
+        finally:
+            self.slots.release()
+
+    # AI 连续落子，直到轮到玩家或对局结束，返回 AI 的落子列表
+    async def computer_moves(self, session, think_time):
+        played = []
+        while session.turn == session.computer:
+            row, col = await self.search(session, think_time)
+            session.play(session.computer, bb.square(row, col))
+            played.append([row, col])
+        return played
+
+    async def cmd_new(self, request):
+        if len(self.sessions) >= self.max_sessions:
+            raise ServerError("对局数已达上限")
+        player = TILE_OF.get(request.get("color", "black"))
+        if player is None:
+            raise ServerError("无效的颜色: {}".format(request.get("color")))
+        difficulty = request.get("difficulty", 2)
+        if isinstance(difficulty, bool) or difficulty not in (0, 1, 2):
+            raise ServerError("无效的难度: {}".format(difficulty))
+        think_time = self.budget(request)
+        session = GameSession(next(self._ids), player, difficulty, asyncio.current_task())
+        self.sessions[session.game_id] = session
+        async with session.lock:
+            played = await self.computer_moves(session, think_time)
+        response = session.as_dict()
+        response["computer_moves"] = played
+        return response
+
+    async def cmd_move(self, request):
+        session = self.session(request)
+        think_time = self.budget(request)
+        row, col = request.get("row"), request.get("col")
+        if not isinstance(row, int) or not isinstance(col, int) or not (0 <= row < 8 and 0 <= col < 8):
+            raise ServerError("无效的位置: [{}, {}]".format(row, col))
+        async with session.lock:
+            if session.turn != session.player:
+                raise ServerError("还没轮到玩家下棋")
+            sq = bb.square(row, col)
+            if not session.moves(session.player) >> sq & 1:
+                raise ServerError("不能在 [{}, {}] 落子".format(row, col))
+            session.play(session.player, sq)
+            played = await self.computer_moves(session, think_time)
+        response = session.as_dict()
+        response["computer_moves"] = played
+        return response
+
+    async def cmd_resume(self, request):
+        session = self.session(request)
+        think_time = self.budget(request)
+        async with session.lock:
+            played = await self.computer_moves(session, think_time)
+        response = session.as_dict()
+        response["computer_moves"] = played
+        return response
+
+    async def cmd_state(self, request):
+        return self.session(request).as_dict()
+
+    async def cmd_close(self, request):
+        session = self.session(request)
+        del self.sessions[session.game_id]
+        return {"game": session.game_id}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reversi AI 对局服务器")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("-w", "--workers", type=int, help="搜索进程数，默认为 CPU 核数")
+    parser.add_argument("--think-time", type=float, default=DEFAULT_THINK_TIME, help="默认每步思考时间（秒）")
+    parser.add_argument("--max-think-time", type=float, default=MAX_THINK_TIME, help="请求允许的最长思考时间（秒）")
+    parser.add_argument("--max-pending", type=int, help="同时排队的搜索数上限，默认为进程数的 2 倍")
+    return parser
+
+
+async def serve(args):
+    server = GameServer(args.workers, args.think_time, args.max_think_time, args.max_pending)
+    host, port = await server.start(args.host, args.port)
+    print("对局服务器监听 {}:{}，搜索进程 {} 个".format(host, port, server.workers))
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
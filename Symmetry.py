@@ -0,0 +1,81 @@
+# 棋盘的 8 种对称变换（正方形的二面体群）及局面规范化
+# 变换编号 k: 第 2 位为转置，第 1 位为上下翻转，第 0 位为左右翻转，按此顺序依次作用
+import Bitboard as bb
+
+SYMMETRY_COUNT = 8
+
+
+# 上下翻转：第 i 行变为第 7 - i 行
+def flip_vertical(x):
+    return int.from_bytes(x.to_bytes(8, "little"), "big")
+
+
+# 左右翻转：第 j 列变为第 7 - j 列
+def mirror_horizontal(x):
+    x = ((x >> 1) & 0x5555555555555555) | ((x & 0x5555555555555555) << 1)
+    x = ((x >> 2) & 0x3333333333333333) | ((x & 0x3333333333333333) << 2)
+    x = ((x >> 4) & 0x0F0F0F0F0F0F0F0F) | ((x & 0x0F0F0F0F0F0F0F0F) << 4)
+    return x
+
+
+# 沿主对角线转置：(i, j) 变为 (j, i)
+def transpose(x):
+    t = 0x0F0F0F0F00000000 & (x ^ (x << 28))
+    x ^= t ^ (t >> 28)
+    t = 0x3333000033330000 & (x ^ (x << 14))
+    x ^= t ^ (t >> 14)
+    t = 0x5500550055005500 & (x ^ (x << 7))
+    x ^= t ^ (t >> 7)
+    return x
+
+
+def transform(x, k):
+    if k & 4:
+        x = transpose(x)
+    if k & 2:
+        x = flip_vertical(x)
+    if k & 1:
+        x = mirror_horizontal(x)
+    return x
+
+
+# SQUARE_MAP[k][sq] 为第 sq 格经变换 k 后的位置，INVERSE_MAP 为其逆
+SQUARE_MAP = [[transform(1 << sq, k).bit_length() - 1 for sq in range(64)] for k in range(SYMMETRY_COUNT)]
+INVERSE_MAP = [[0] * 64 for _ in range(SYMMETRY_COUNT)]
+for _k in range(SYMMETRY_COUNT):
+    for _sq in range(64):
+        INVERSE_MAP[_k][SQUARE_MAP[_k][_sq]] = _sq
+
+
+# 规范形式: 8 种变换中 (own, opp) 最小的一种，返回 (own, opp, 变换编号)
+def canonical(own, opp):
+    best = (own, opp, 0)
+    for k in range(1, SYMMETRY_COUNT):
+        t_own = transform(own, k)
+        if t_own > best[0]:
+            continue
+        t_opp = transform(opp, k)
+        if (t_own, t_opp) < best[:2]:
+            best = (t_own, t_opp, k)
+    return best
+
+
+# 局面 board 上 tile 一方的规范形式
+def canonical_board(board, tile):
+    return canonical(board.stones[tile], board.stones[bb.opponent(tile)])
+
+
+# 去掉落子后局面互相对称的重复走法，每组只保留位置最小的一个，返回走法掩码
+def unique_moves(board, tile, moves):
+    own = board.stones[tile]
+    opp = board.stones[bb.opponent(tile)]
+    seen = set()
+    result = 0
+    for sq in bb.iter_bits(moves):
+        bit = 1 << sq
+        flips = bb.get_flips(own, opp, sq)
+        key = canonical(opp ^ flips, own | flips | bit)[:2]
+        if key not in seen:
+            seen.add(key)
+            result |= bit
+    return result
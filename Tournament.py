@@ -0,0 +1,172 @@
+# 多进程自对弈锦标赛：对局分发到进程池，每局独立随机种子和随机开局
+# 每局结束即把结果写入 JSONL 文件，最后汇总胜率及置信区间
+# 用法: python Tournament.py -n 200 --workers 8 -a mcts:HARD -b mcts:MEDIUM -o results.jsonl
+import argparse
+import json
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import MCTS_Algorithm as rvs
+import Headless
+import Game_Record
+
+WHITE_NUM = Headless.WHITE_NUM
+BLACK_NUM = Headless.BLACK_NUM
+COLOR_KEY = {WHITE_NUM: "white", BLACK_NUM: "black", 0: "draw"}
+
+
+# 解析 "引擎[:难度]"，如 mcts:HARD，返回 (引擎, 难度)
+def parse_player(value):
+    engine, _, difficulty = value.partition(":")
+    if engine not in Headless.ENGINES:
+        raise argparse.ArgumentTypeError("引擎应为 {}".format("/".join(Headless.ENGINES)))
+    return engine, Headless.parse_difficulty(difficulty) if difficulty else 0
+
+
+# 进程池中执行的单局对局，players 以颜色为键，值为选手名称 "a" / "b"
+def play_one(game_id, seed, players, specs, think_time, opening_plies):
+    random.seed(seed)
+    engines = {tile: specs[name][0] for tile, name in players.items()}
+    difficulties = {tile: specs[name][1] for tile, name in players.items()}
+    game = Headless.play_game(engines, difficulties, think_time, opening_plies=opening_plies)
+    return {
+        "game": game_id,
+        "seed": seed,
+        "white": players[WHITE_NUM],
+        "black": players[BLACK_NUM],
+        "winner": COLOR_KEY[game.winner],
+        "white_num": game.white_num,
+        "black_num": game.black_num,
+        "moves": [[COLOR_KEY[tile], sq, round(cost, 6)] for tile, sq, cost in game.moves],
+    }
+
+
+# 由 play_one 返回的结果生成棋谱
+def game_record(record, specs):
+    players = {WHITE_NUM: record["white"], BLACK_NUM: record["black"]}
+    return Game_Record.GameRecord(
+        {tile: specs[name][0] for tile, name in players.items()},
+        {tile: specs[name][1] for tile, name in players.items()},
+        record["seed"],
+        [(sq, cost) for color, sq, cost in record["moves"]],
+        record["white_num"],
+        record["black_num"],
+    )
+
+
+# Wilson 区间，score 为得分率（和棋计半分），z=1.96 对应 95% 置信度
+def wilson_interval(score, n, z=1.96):
+    if n == 0:
+        return 0.0, 1.0
+    denom = 1 + z * z / n
+    center = (score + z * z / (2 * n)) / denom
+    half = z * math.sqrt(score * (1 - score) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+# 以选手 a 的视角汇总胜负
+class Standings:
+    def __init__(self):
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        # 选手 a 执白 / 执黑时的得分
+        self.color_score = {"white": [0.0, 0], "black": [0.0, 0]}
+
+    def add(self, record):
+        color_a = "white" if record["white"] == "a" else "black"
+        if record["winner"] == "draw":
+            point = 0.5
+            self.draws += 1
+        elif record["winner"] == color_a:
+            point = 1.0
+            self.wins += 1
+        else:
+            point = 0.0
+            self.losses += 1
+        self.games += 1
+        self.color_score[color_a][0] += point
+        self.color_score[color_a][1] += 1
+
+    @property
+    def score(self):
+        return (self.wins + 0.5 * self.draws) / self.games if self.games else 0.0
+
+    def __str__(self):
+        low, high = wilson_interval(self.score, self.games)
+        lines = [
+            "共下 {} 局, a 赢 {} 局, b 赢 {} 局，和棋 {} 局".format(self.games, self.wins, self.losses, self.draws),
+            "a 得分率: {:.4f}, 95% 置信区间: [{:.4f}, {:.4f}]".format(self.score, low, high),
+        ]
+        for color, (points, n) in self.color_score.items():
+            if n:
+                lines.append("a 执{}: {} 局, 得分率 {:.4f}".format("白" if color == "white" else "黑", n, points / n))
+        return "\n".join(lines)
+
+
+# 运行锦标赛，返回 Standings；swap_colors 为 True 时双方每局交换颜色
+# record: 逐局追加写入的棋谱文件
+def run_tournament(games, specs, workers=1, think_time=None, opening_plies=4, seed=0, output=None,
+                   swap_colors=True, record=None):
+    standings = Standings()
+    out = open(output, "a", encoding="utf-8") if output else None
+    writer = Game_Record.RecordWriter(record) if record else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for game_id in range(games):
+                if swap_colors and game_id % 2:
+                    players = {WHITE_NUM: "b", BLACK_NUM: "a"}
+                else:
+                    players = {WHITE_NUM: "a", BLACK_NUM: "b"}
+                futures.append(
+                    pool.submit(play_one, game_id, seed + game_id, players, specs, think_time, opening_plies)
+                )
+            for future in as_completed(futures):
+                record = future.result()
+                standings.add(record)
+                if out:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    out.flush()
+                if writer:
+                    writer.write(game_record(record, specs))
+                    writer.flush()
+                print("第 {} 局: 白棋({}) {} - {} 黑棋({})".format(
+                    record["game"], record["white"], record["white_num"], record["black_num"], record["black"]))
+    finally:
+        if out:
+            out.close()
+        if writer:
+            writer.close()
+    return standings
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Reversi AI 多进程自对弈锦标赛")
+    parser.add_argument("-n", "--games", type=int, default=100, help="棋局总数")
+    parser.add_argument("-a", "--player-a", type=parse_player, default=("mcts", 2), help="选手 a，格式为 引擎[:难度]")
+    parser.add_argument("-b", "--player-b", type=parse_player, default=("random", 0), help="选手 b，格式为 引擎[:难度]")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="进程数")
+    parser.add_argument("--think-time", type=float, help="AI 每步思考时间（秒）")
+    parser.add_argument("--opening-plies", type=int, default=4, help="开局随机落子的步数")
+    parser.add_argument("--seed", type=int, default=0, help="第一局的随机种子，之后每局加一")
+    parser.add_argument("--no-swap", action="store_true", help="不交换颜色，选手 a 始终执白")
+    parser.add_argument("-o", "--output", help="逐局结果追加写入的 JSONL 文件")
+    parser.add_argument("--record", help="逐局追加写入的棋谱文件，格式见 Game_Record.py")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    specs = {"a": args.player_a, "b": args.player_b}
+    standings = run_tournament(
+        args.games, specs, args.workers, args.think_time, args.opening_plies, args.seed, args.output,
+        swap_colors=not args.no_swap, record=args.record,
+    )
+    print(standings)
+    rvs.shutdown_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Zobrist 哈希与置换表
+# 不同走子顺序到达的同一局面在置换表中共享模拟次数和奖励
+import random
+import Bitboard as bb
+import Symmetry
+
+ZOBRIST_SEED = 0x5EED
+
+_rng = random.Random(ZOBRIST_SEED)
+# 每种颜色每个格子的随机键
+ZOBRIST = {tile: [_rng.getrandbits(64) for _ in range(64)] for tile in (bb.WHITE_NUM, bb.BLACK_NUM)}
+# 轮到黑棋下时额外异或的键
+ZOBRIST_SIDE = _rng.getrandbits(64)
+
+
+# 按字节预先异或好的键，一个 64 位掩码只需 8 次查表
+def _byte_tables(keys):
+    tables = []
+    for k in range(8):
+        table = [0] * 256
+        for value in range(256):
+            h = 0
+            for bit in range(8):
+                if value >> bit & 1:
+                    h ^= keys[k * 8 + bit]
+            table[value] = h
+        tables.append(table)
+    return tables
+
+
+_TABLES = {tile: _byte_tables(keys) for tile, keys in ZOBRIST.items()}
+
+
+def _hash_mask(tables, mask):
+    h = 0
+    for table in tables:
+        h ^= table[mask & 0xFF]
+        mask >>= 8
+    return h
+
+
+# 规范形式下的 Zobrist 哈希，互相对称的局面哈希相同
+def canonical_hash(board, tile):
+    white, black, k = Symmetry.canonical(board.stones[bb.WHITE_NUM], board.stones[bb.BLACK_NUM])
+    h = _hash_mask(_TABLES[bb.WHITE_NUM], white) ^ _hash_mask(_TABLES[bb.BLACK_NUM], black)
+    if tile == bb.BLACK_NUM:
+        h ^= ZOBRIST_SIDE
+    return h
+
+
+# 以轮到下棋一方为准的局面哈希 (own, opp)，与颜色无关
+def position_hash(own, opp):
+    return _hash_mask(_TABLES[bb.WHITE_NUM], own) ^ _hash_mask(_TABLES[bb.BLACK_NUM], opp)
+
+
+class Entry:
+    __slots__ = ("key", "nplayout", "reward")
+
+    def __init__(self, key):
+        self.key = key
+        self.nplayout = 0
+        self.reward = 0
+
+
+# 定长置换表，两路组相联：每个哈希对应相邻的两个槽位，
+# 都被占用时替换模拟次数较少的一项
+class TranspositionTable:
+    def __init__(self, size):
+        # 大小取不小于 size 的 2 的幂
+        bits = max(1, (size - 1).bit_length())
+        self.mask = (1 << bits) - 2
+        self.table = [None] * (1 << bits)
+
+    def get(self, key):
+        idx = key & self.mask
+        entry = self.table[idx]
+        if entry is not None and entry.key == key:
+            return entry
+        entry = self.table[idx + 1]
+        if entry is not None and entry.key == key:
+            return entry
+        return None
+
+    # 累加一个局面的模拟次数和奖励
+    def update(self, key, nplayout, reward):
+        idx = key & self.mask
+        first = self.table[idx]
+        second = self.table[idx + 1]
+        if first is not None and first.key == key:
+            entry = first
+        elif second is not None and second.key == key:
+            entry = second
+        else:
+            entry = Entry(key)
+            if first is None or (second is not None and first.nplayout <= second.nplayout):
+                self.table[idx] = entry
+            else:
+                self.table[idx + 1] = entry
+        entry.nplayout += nplayout
+        entry.reward += reward
+        return entry
+
+    def __len__(self):
+        return sum(entry is not None for entry in self.table)
@@ -1,14 +1,20 @@
 import ctypes
+import os
 import sys
 import random
 import platform
 import time
+import threading
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import scrolledtext
 from tkinter import messagebox
 from tkinter import simpledialog
 from enum import Enum
 import MCTS_Algorithm as rvs
+import Bitboard as bb
+from Headless import Result
+import Game_Record
 
 
 # 输出重定向到窗口中
@@ -86,15 +92,15 @@ class ReversiData:
         #  |
         #  y
 
-        self.board = [[ChessPiece.DEFAULT] * 8 for _ in range(8)]
-        self.board[3][3] = ChessPiece.WHITE
-        self.board[3][4] = ChessPiece.BLACK
-        self.board[4][3] = ChessPiece.BLACK
-        self.board[4][4] = ChessPiece.WHITE
+        # 与 AI 搜索共用同一种位棋盘，board.get(row, col) 的值与 ChessPiece 对应
+        self.board = bb.initial_board()
 
         self.state = state
         self.difficulty = Difficulty.EASY
         self.current_chesspiece_num = 4  # 当前棋子数量
+        self.thinking = False  # AI 是否正在后台计算
+        self.moves = []  # 每步棋: (位置 0-63, 思考时间)
+        self.seed = 0  # 自动下棋时本局的随机种子，记录到棋谱中
 
     def __repr__(self):
         tmp_str = "========== 调试信息 ==========\n"
@@ -103,7 +109,7 @@ class ReversiData:
         # board
         for row in range(8):
             for col in range(8):
-                tmp_str = tmp_str + str(data.board[row][col].value) + "  "
+                tmp_str = tmp_str + str(self.board.get(row, col)) + "  "
             tmp_str = tmp_str + "\n"
         return tmp_str
 
@@ -176,7 +182,8 @@ class ReversiGUI(tk.Tk):
         for row in range(8):
             for col in range(8):
                 # 5 点偏移量是为了美观性
-                if data.board[row][col] == ChessPiece.WHITE:
+                piece = data.board.get(row, col)
+                if piece == bb.WHITE_NUM:
                     self.board.create_oval(
                         self.line_width * col + 5,
                         self.line_width * row + 5,
@@ -185,7 +192,7 @@ class ReversiGUI(tk.Tk):
                         fill="white",
                         width=2,
                     )
-                elif data.board[row][col] == ChessPiece.BLACK:
+                elif piece == bb.BLACK_NUM:
                     self.board.create_oval(
                         self.line_width * col + 5,
                         self.line_width * row + 5,
@@ -196,12 +203,8 @@ class ReversiGUI(tk.Tk):
                     )
         # 处理棋局结束状态
         if data.state == GameState.FINISH:
-            white_num = 0
-            black_num = 0
-            for row in range(8):
-                for col in range(8):
-                    white_num += data.board[row][col] == ChessPiece.WHITE
-                    black_num += data.board[row][col] == ChessPiece.BLACK
+            white_num = bb.popcount(data.board.stones[bb.WHITE_NUM])
+            black_num = bb.popcount(data.board.stones[bb.BLACK_NUM])
             who_win = lambda a, b: (
                 "白棋赢" if a > b else ("黑棋赢" if b > a else "平局")
             )
@@ -219,7 +222,7 @@ class ReversiGUI(tk.Tk):
             if not t:
                 print("黑棋当前无子可下，白棋再下一回合")
                 # 判断AI是否有子可下
-                if not ai():
+                if not ai_async():
                     data.state = GameState.FINISH
                     print("双方都无子可下，提前结束棋局")
                     self.draw()
@@ -255,11 +258,9 @@ def set_difficulty(event):
 
 
 def click_left(event):
-
-    # todo: 避免AI还没下完的时候人类又点击鼠标
-
     global data
-    if data.state == GameState.FINISH:
+    # AI 还没下完的时候忽略人类的点击
+    if data.state == GameState.FINISH or data.thinking:
         return
     if data.state == GameState.STOP:
         data.state = GameState.START
@@ -275,228 +276,227 @@ def click_left(event):
     if col == 8:
         col = col - 1
 
-    # 获取当前人类可以下的棋子位置
-    t = candidate_position()
-
-    if Position(row, col) in t:
+    # 判断人类能否在该位置落子
+    if candidate_moves() >> bb.square(row, col) & 1:
+        # 人类已落子，结束预读，接下来的搜索排在预读之后执行
+        ponder_stop()
         put_chess_piece(row, col, ChessPiece.BLACK)
         if data.current_chesspiece_num == 64:
             data.state = GameState.FINISH
             gui.draw()
             return
         gui.draw()
-        ai()
+        if not data.thinking:
+            ai_async()
 
 
-def put_chess_piece(row, col, color):
+def put_chess_piece(row, col, color, cost=0.0):
     global data
-    # 落子
-    data.board[row][col] = color
-    # 调用 reverse() 翻转
-    reverse(row, col, data.board[row][col])
+    # 落子并翻转
+    sq = bb.square(row, col)
+    data.board.play(color.value, sq)
+    data.moves.append((sq, cost))
     # 整个棋盘多一颗棋子
     data.current_chesspiece_num += 1
 
 
-def transform_board():
-    board = {}
-    for row in range(8):
-        board[row] = {}
-        for col in range(8):
-            board[row][col] = data.board[row][col].value
-    return board
-
-
 # AI 落子
 def ai():
-    global total_Time
-    tmp_borad = transform_board()
     # 判断AI是否无子可下
-    if not rvs.possible_positions(tmp_borad, rvs.COMPUTER_NUM):
+    if not rvs.possible_positions(data.board, rvs.COMPUTER_NUM):
         print("白棋当前无子可下，黑棋再下一回合")
         return False
     start_time = time.perf_counter()
-    row, col = rvs.mctsNextPosition(tmp_borad, data.difficulty.value)
+    row, col = rvs.mctsNextPosition(data.board, data.difficulty.value)
     end_time = time.perf_counter()
-    total_Time = total_Time + end_time - start_time
+    put_ai_chess_piece(row, col, end_time - start_time)
+    return True
+
+
+# AI 在后台线程中计算，界面保持响应，计算完成后在主循环中落子
+# 返回 False 表示AI无子可下
+def ai_async():
+    # 判断AI是否无子可下
+    if not rvs.possible_positions(data.board, rvs.COMPUTER_NUM):
+        print("白棋当前无子可下，黑棋再下一回合")
+        return False
+    data.thinking = True
+    stats = rvs.SearchStats(TRACE_MEMORY)
+    # 后台线程使用棋盘副本，界面线程可以随时读取 data.board
+    future = ai_executor.submit(rvs.mctsNextPosition, data.board.copy(), data.difficulty.value, stats=stats)
+    gui.after(AI_POLL_INTERVAL, ai_poll, future, data, time.perf_counter(), stats)
+    return True
+
+
+# 轮询后台计算结果，game 为发起计算时的棋局，棋局已重置则丢弃结果
+# 搜索统计在后台线程写入，计算完成后才在主循环中读取
+def ai_poll(future, game, start_time, stats):
+    if game is not data:
+        return
+    cost = time.perf_counter() - start_time
+    if not future.done():
+        gui.title("Reversi AI - 白棋思考中 {:.1f} 秒".format(cost))
+        gui.after(AI_POLL_INTERVAL, ai_poll, future, game, start_time, stats)
+        return
+    data.thinking = False
+    row, col = future.result()
+    gui.title("Reversi AI - {} {} 次/秒".format(stats.source, int(stats.playouts_per_sec)))
+    print(stats)
+    put_ai_chess_piece(row, col, cost)
+    ponder_start()
+
+
+def put_ai_chess_piece(row, col, cost):
+    global total_Time
+    total_Time = total_Time + cost
     # fmt: off
-    print("白棋落子 [{}, {}], 此步耗时: {:.6} 秒".format(row, col, end_time - start_time))
+    print("白棋落子 [{}, {}], 此步耗时: {:.6} 秒".format(row, col, cost))
     # fmt: on
-    put_chess_piece(row, col, ChessPiece.WHITE)
+    put_chess_piece(row, col, ChessPiece.WHITE, cost)
     if data.current_chesspiece_num == 64:
         data.state = GameState.FINISH
     if data.state != GameState.AUTO:
         gui.draw()
-    return True
 
 
-def reverse(row, col, color):
-    # 棋局状态存储在data.board[row][col]中，当落点为(row,col)且颜色为color时，翻转需要翻转的对手棋子
-    # 找到要翻转的对手棋子后将data.board[row][col]修改为另一种颜色即可，例如将黑色棋子改为白色：data.board[row][col] = ChessPiece.WHITE
+# 预读：对手思考期间在后台线程中继续搜索，对手落子后 AI 沿用实际应手的子树
+# 预读和 AI 搜索在同一个线程中依次执行，不会同时修改搜索树
+def ponder_start():
+    global ponder
+    if not PONDER or data.thinking or data.state == GameState.FINISH:
+        return
+    stop = threading.Event()
+    future = ai_executor.submit(rvs.mctsPonder, data.board.copy(), data.difficulty.value, stop)
+    ponder = (future, stop)
 
-    directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
 
-    # 遍历
-    for direction in directions:
-        dx, dy = direction
-        x, y = row + dx, col + dy
-        flipped = False  # 是否找到可以翻转的对手棋子
+# 结束预读，wait 为 True 时等待后台线程退出并返回预读的模拟次数
+def ponder_stop(wait=False):
+    global ponder
+    if ponder is None:
+        return 0
+    future, stop = ponder
+    ponder = None
+    stop.set()
+    if wait:
+        return future.result()
+    return 0
 
-        # 在当前方向上查找对手的棋子
-        while 0 <= x < 8 and 0 <= y < 8:
-            if data.board[x][y] == ChessPiece.DEFAULT:
-                break
-            elif data.board[x][y] == color:
-                if flipped:
-                    x, y = row + dx, col + dy  # 从头翻转
-                    while data.board[x][y] != color:
-                        data.board[x][y] = color
-                        x += dx
-                        y += dy
-                    break
-                else:
-                    break
-            else:
-                flipped = True  # 发现对手棋子，标记为可翻转
-            x += dx
-            y += dy
+
+# 黑棋可以下的位置掩码
+def candidate_moves():
+    return bb.get_moves(data.board.stones[bb.BLACK_NUM], data.board.stones[bb.WHITE_NUM])
 
 
 # 返回黑棋可能下的位置
 def candidate_position():
-    pos = []
-    for row in range(8):
-        for col in range(8):
-            # 根据下棋规则判断位置是否可下
-            if data.board[row][col] == ChessPiece.DEFAULT:
-                if is_valid_move(row, col, ChessPiece.BLACK):
-                    pos.append(Position(row, col))
-
-    return pos
-
-
-def is_valid_move(row, col, rowor):
-    # 依据游戏规则进行判断，该位置（row , col）可以下棋返回true
-    # rowor: 本次下棋的棋子颜色
-    # 该位置必须能翻转棋子才能下棋
-    # 翻转规则：当自己放下的棋子在横向，竖向，斜向八个方向内有一个自己的棋子，则被夹在中间的的棋子全部翻转为自己的棋子，被夹在中间的必须是对方的棋子，不能含有空格
-
-    # 判断该位置是否为空
-    if data.board[row][col] != ChessPiece.DEFAULT:
-        return False
-
-    # 定义八个方向的偏移量，用于在棋盘上沿着这些方向进行检查
-    directions = [(0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (-1, -1), (1, -1), (-1, 1)]
-
-    # 遍历八个方向
-    for direction in directions:
-        dx, dy = direction
-        x, y = row + dx, col + dy
-        flipped = False  # 是否找到可以翻转的对方棋子
-
-        # 在当前方向上查找对方的棋子
-        while 0 <= x < 8 and 0 <= y < 8:
-            if data.board[x][y] == ChessPiece.DEFAULT:
-                break  # 遇到空格，结束查找
-            elif data.board[x][y] == rowor:
-                if flipped:
-                    return True  # 找到对方棋子且夹在中间，可以翻转
-                else:
-                    break  # 没有夹在中间的对方棋子，不可翻转
-            else:
-                flipped = True  # 发现对方棋子，标记为可翻转
-            x += dx
-            y += dy
-
-    return False  # 无法在任何方向上找到可以翻转的对方棋子
+    return [Position(*bb.to_position(sq)) for sq in bb.iter_bits(candidate_moves())]
 
 
 def click_right(event):
     global data
+    # 自动下棋在主线程中搜索，输出刷新窗口时仍会处理点击，此时不能重置
+    if data.state in (GameState.AUTO, GameState.AUTO_FINISH):
+        return
+    # 后台可能还有搜索或预读在使用搜索树，清空搜索树排在它们之后执行
+    ponder_stop()
+    ai_executor.submit(rvs.reset_tree)
     data = ReversiData()
+    gui.title("Reversi AI")
     print("棋局已重置")
     print("=============================")
     gui.draw()
 
 
 # ------------------------------------- 自动下棋代码 Start -----------------------------------
-class Result:
-    def __init__(self):
-        self.white_num = 0
-        self.black_num = 0
-        self.loop = 0
-        self.white_win = 0
-        self.black_win = 0
-        self.no_win = 0
-
-
 def click_auto(event):
     global data
     global total_Time
+    if data.thinking:
+        return
     loop = simpledialog.askinteger("Auto", "请输入棋局总数")
     if loop is None:
         return
+    # 之前的棋局可能还有搜索或预读在后台使用搜索树（右键重置不等它们结束），
+    # 排在它们之后清空搜索树并等待完成，之后才能在主线程中搜索
+    ponder_stop()
+    ai_executor.submit(rvs.reset_tree).result()
     result = Result()
-
-    while result.loop < int(loop):
-        data = ReversiData(GameState.AUTO)
-        total_Time = 0
-        auto_run()
-        save_result(result)
-    # fmt: off
-    print("共下 {} 局, 白棋赢 {} 局, 黑棋赢 {} 局，和棋 {} 局".format(result.loop, result.white_win, result.black_win, result.no_win))
-    print("白棋共有: {}, 平均每局: {}".format(result.white_num, result.white_num / result.loop))
-    print("黑棋共有: {}, 平均每局: {}".format(result.black_num, result.black_num / result.loop))
-    # fmt: on
+    writer = Game_Record.RecordWriter(AUTO_RECORD_PATH) if AUTO_RECORD_PATH else None
+    # 与 Headless.run_games 一样，每局开始前用 seed + 局数重新设置随机种子，棋谱可以复现
+    seed = random.randrange(0, 2**32)
+
+    try:
+        while result.loop < int(loop):
+            data = ReversiData(GameState.AUTO)
+            data.seed = (seed + result.loop) & 0xFFFFFFFF
+            random.seed(data.seed)
+            rvs.reset_tree()
+            total_Time = 0
+            auto_run()
+            save_result(result, writer)
+    finally:
+        if writer:
+            writer.close()
+    print(result)
     data = ReversiData()
 
 
-def save_result(result):
-    white_num = 0
-    black_num = 0
-    for row in range(8):
-        for col in range(8):
-            white_num += data.board[row][col] == ChessPiece.WHITE
-            black_num += data.board[row][col] == ChessPiece.BLACK
+def save_result(result, writer=None):
+    white_num = bb.popcount(data.board.stones[bb.WHITE_NUM])
+    black_num = bb.popcount(data.board.stones[bb.BLACK_NUM])
     who_win = lambda a, b: ("白棋赢" if a > b else ("黑棋赢" if b > a else "平局"))
     # fmt: off
     print("白棋:{}, 黑棋:{}, {}\nAI总耗时: {:.6} 秒".format(white_num, black_num, who_win(white_num, black_num), total_Time))
     # fmt: on
-    result.white_num += white_num
-    result.black_num += black_num
-    result.loop += 1
-    result.white_win += white_num > black_num
-    result.black_win += white_num < black_num
-    result.no_win += white_num == black_num
+    result.add(white_num, black_num)
+    # 白棋为 AI，黑棋随机落子
+    if writer:
+        engines = {bb.WHITE_NUM: "mcts", bb.BLACK_NUM: "random"}
+        difficulties = {bb.WHITE_NUM: data.difficulty.value, bb.BLACK_NUM: None}
+        writer.write(Game_Record.GameRecord(engines, difficulties, data.seed, data.moves, white_num, black_num))
 
 
+# 白棋落子后在后台预读，黑棋选点落子期间预读继续，AI 在主线程中搜索前等预读退出
 def auto_run():
     global data
     while True:
-        t = candidate_position()
-        if not t:
+        moves = candidate_moves()
+        if not moves:
             print("黑棋当前无子可下，白棋再下一回合")
+            ponder_stop(wait=True)
             if not ai():
                 print("双方都无子可下，提前结束棋局")
                 break
             if data.current_chesspiece_num == 64:
                 break
+            ponder_start()
             continue
-        pos = random.choice(t)
-        row = pos.row
-        col = pos.col
+        row, col = bb.to_position(random.choice(list(bb.iter_bits(moves))))
         print("黑棋落子 [{}, {}]".format(row, col))
         put_chess_piece(row, col, ChessPiece.BLACK)
+        ponder_stop(wait=True)
         # 判断棋局是否结束
         if data.current_chesspiece_num == 64:
             break
         ai()
         if data.current_chesspiece_num == 64:
             break
+        ponder_start()
+    ponder_stop(wait=True)
 
 
 # ------------------------------------- 自动下棋代码 End -----------------------------------
 
+# 后台计算AI落子的线程，同一时间只有一个搜索
+ai_executor = ThreadPoolExecutor(max_workers=1)
+AI_POLL_INTERVAL = 100  # 轮询间隔（毫秒）
+# 自动下棋的棋谱追加写入的文件，与本文件在同一目录，None 表示不保存
+AUTO_RECORD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "auto_games.rvgr")
+PONDER = True  # 是否在对手思考期间预读
+TRACE_MEMORY = False  # 是否在搜索统计中记录内存峰值，开启后搜索会慢很多
+ponder = None  # 正在进行的预读: (future, 停止事件)
+
 if __name__ == "__main__":
     if platform.system() != "Windows":
         raise SystemExit("只支持 Windows 平台")
@@ -508,3 +508,6 @@ if __name__ == "__main__":
     total_Time = 0
 
     gui.mainloop()
+
+    ponder_stop()
+    ai_executor.shutdown(wait=False, cancel_futures=True)